@@ -6,7 +6,7 @@ from app.services.google_services.google_auth_service import GoogleAuthService
 from app.services.user_services.handler import UserService
 from app.services.auth_services import create_access_token, get_fernet
 from app.services.google_services.auth_handler import GoogleAuthHandler
-from app.services.google_services.handler import GmailClient
+from app.services.google_services.client_pool import gmail_client_pool, create_gmail_client
 
 from app.core.config import settings
 
@@ -55,10 +55,14 @@ async def auth_google(code: str, user_service: UserService = Depends()):
     if refresh_token:
         fernet = get_fernet()
         encrypted_refresh_token = fernet.encrypt(refresh_token.encode()).decode()
-        user_service.collection.update_one(
+        await user_service.collection.update_one(
             {"_id": user._id},
             {"$set": {"encrypted_google_refresh_token": encrypted_refresh_token}}
         )
+        # Drop the cached credentials and any pooled client still built on the previous refresh token.
+        if user.encrypted_google_refresh_token:
+            GoogleAuthHandler.invalidate(user.encrypted_google_refresh_token)
+        gmail_client_pool.invalidate(email)
         
         # If this is a new user, automatically set up the watch for them.
         if is_new_user:
@@ -67,7 +71,7 @@ async def auth_google(code: str, user_service: UserService = Depends()):
                 auth_handler = GoogleAuthHandler()
                 # We use the encrypted refresh token to get credentials for the watch call
                 credentials = auth_handler.get_credentials_from_refresh_token(encrypted_refresh_token)
-                gmail_client = GmailClient(credentials)
+                gmail_client = create_gmail_client(credentials, email)
                 gmail_client.watch(topic_name=TOPIC_NAME)
                 print("Gmail watch setup successful.")
             except Exception as e:
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.services.rules_services import RuleService
 from app.services.ai_model_services import ZeroShotClassifier
+from app.services.model_registry import ModelRegistry, get_model_registry
 from app.services.filtering_service import EmailFilteringService
 from app.services.google_services.auth_handler import GoogleAuthHandler
-from app.services.google_services.handler import GmailClient
+from app.services.google_services.client_pool import gmail_client_pool
+from app.services.auth_services import get_current_user
+from app.models.user_model import User
 from app.schemas.filtering_schema import FilterRequest, FilterResponse, FilterResult, RunFilterRequest
 from app.models.rules_model import RuleModel
 
@@ -15,34 +19,45 @@ router = APIRouter(
 def get_rule_service():
     return RuleService()
 
-def get_classifier():
-    return ZeroShotClassifier()
+def get_classifier(model_registry: ModelRegistry = Depends(get_model_registry)):
+    return model_registry.get_rule_scorer()
 
 def get_google_auth_handler():
     return GoogleAuthHandler()
 
-def get_gmail_client(auth_handler: GoogleAuthHandler = Depends(get_google_auth_handler)):
-    return GmailClient(auth_handler=auth_handler)
+def fetch_today_emails(user: User, auth_handler: GoogleAuthHandler) -> list[str]:
+    credentials_factory = lambda: auth_handler.get_credentials_from_refresh_token(user.encrypted_google_refresh_token)
+    with gmail_client_pool.lease(user.email, credentials_factory) as gmail_client:
+        return gmail_client.get_today_emails()
 
 def get_email_filtering_service(
     rule_service: RuleService = Depends(get_rule_service),
-    classifier: ZeroShotClassifier = Depends(get_classifier)
+    classifier: ZeroShotClassifier = Depends(get_classifier),
+    model_registry: ModelRegistry = Depends(get_model_registry)
 ):
-    return EmailFilteringService(rule_service=rule_service, classifier=classifier)
+    return EmailFilteringService(
+        rule_service=rule_service,
+        classifier=classifier,
+        prefilter=model_registry.get_rule_prefilter(),
+        cache=model_registry.get_classification_cache()
+    )
 
 @router.post("/apply", response_model=FilterResponse)
 async def apply_filter(
     request: FilterRequest,
     filtering_service: EmailFilteringService = Depends(get_email_filtering_service),
-    rule_service: RuleService = Depends(get_rule_service)
+    rule_service: RuleService = Depends(get_rule_service),
+    current_user: User = Depends(get_current_user)
 ):
-    rules_to_apply = [rule_service.get_rule_by_id(rule_id) for rule_id in request.rule_ids]
+    rules_to_apply = [await rule_service.get_rule_by_id(rule_id, user_id=str(current_user._id)) for rule_id in request.rule_ids]
     rules_to_apply = [rule for rule in rules_to_apply if rule is not None]
 
     if not rules_to_apply:
         raise HTTPException(status_code=400, detail="No valid rules found for provided IDs.")
 
-    aggregated_score = filtering_service.filter_emails_by_rules(
+    # Scored off the event loop so concurrent requests can share inference batches.
+    aggregated_score = await run_in_threadpool(
+        filtering_service.filter_emails_by_rules,
         email_content=request.email_content,
         rules=rules_to_apply
     )
@@ -57,14 +72,19 @@ async def apply_filter(
 @router.post("/run", response_model=FilterResponse)
 async def run_full_filter(
     request: RunFilterRequest,
-    gmail_client: GmailClient = Depends(get_gmail_client),
+    auth_handler: GoogleAuthHandler = Depends(get_google_auth_handler),
     filtering_service: EmailFilteringService = Depends(get_email_filtering_service),
-    rule_service: RuleService = Depends(get_rule_service)
+    rule_service: RuleService = Depends(get_rule_service),
+    current_user: User = Depends(get_current_user)
 ):
-    email_snippets = gmail_client.get_today_emails()
+    if not current_user.encrypted_google_refresh_token:
+        raise HTTPException(status_code=400, detail="No Google account linked for this user.")
+
+    # Uses the user's pooled Gmail client; run in a thread as the Gmail calls block.
+    email_snippets = await run_in_threadpool(fetch_today_emails, current_user, auth_handler)
     print(f"found {len(email_snippets)} emails from last 24 hours")
     
-    rules_to_apply = [rule_service.get_rule_by_id(rule_id) for rule_id in request.rule_ids]
+    rules_to_apply = [await rule_service.get_rule_by_id(rule_id, user_id=str(current_user._id)) for rule_id in request.rule_ids]
     rules_to_apply = [rule for rule in rules_to_apply if rule is not None]
 
     if not rules_to_apply:
@@ -75,7 +95,8 @@ async def run_full_filter(
         if not snippet:
             continue
 
-        aggregated_score = filtering_service.filter_emails_by_rules(
+        aggregated_score = await run_in_threadpool(
+            filtering_service.filter_emails_by_rules,
             email_content=snippet,
             rules=rules_to_apply
         )
@@ -89,3 +110,14 @@ async def run_full_filter(
             ))
 
     return FilterResponse(results=matched_results)
+
+@router.get("/prefilter/report")
+async def prefilter_report(model_registry: ModelRegistry = Depends(get_model_registry)):
+    """
+    Reports how many rules the embedding prefilter cuts and its recall against
+    the exhaustive NLI path on audited emails.
+    """
+    prefilter = model_registry.get_rule_prefilter()
+    if prefilter is None:
+        return {"enabled": False}
+    return {"enabled": True, **prefilter.report()}
@@ -1,41 +1,106 @@
-from fastapi import APIRouter, Request, status, Response
+import asyncio
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Response
 from app.services.gmail_webhook import GmailWebhookHandler
+from app.services.webhook_worker_pool import webhook_worker_pool
+from app.services.google_services.client_pool import gmail_client_pool
+from app.services.processed_email_service import ProcessedEmailService
+from app.services.rules_cache import rules_cache
+from app.services.notification_coalescer import notification_coalescer
+from app.services.pubsub_dedup import pubsub_deduplicator
+from app.services.filtering_service import rule_evaluation_stats
+from app.services.notification_stream import notification_stream
+from app.core.config import settings
 from app.schemas.pubsub_schema import PubSubNotification
-from app.schemas.processed_email_schema import ProcessedEmail # Re-add this import
-from typing import List # Re-add this import
+from app.schemas.processed_email_schema import ProcessedEmail, ProcessedEmailPage
+from app.services.auth_services import get_current_user
+from app.models.user_model import User
+from typing import Optional
 
 router = APIRouter()
 
 @router.post("/gmail-webhook")
 async def gmail_webhook(notification: PubSubNotification):
     """
-    Receives push notifications from Google Pub/Sub and hands them off
-    to a handler class for processing.
+    Receives push notifications from Google Pub/Sub, validates them and
+    queues them for the background worker pool, or on the Redis Stream read
+    by `worker.py` when NOTIFICATION_QUEUE_BACKEND is "redis_stream".
 
-    This endpoint always returns a 200 OK to acknowledge receipt
-    and prevent Google from resending the notification.
+    Returns 200 OK as soon as the notification is queued (or rejected as
+    invalid, so Google doesn't keep resending it). When it can't be queued a
+    503 is returned so Pub/Sub redelivers later instead of losing the work.
     """
     payload_data = notification.message.data
+    message_id = notification.message.messageId
+
+    # Pub/Sub delivers at least once; drop redeliveries before doing any work.
+    if pubsub_deduplicator.is_duplicate(message_id):
+        print(f"[API] Duplicate Pub/Sub message {message_id}. Returning 200 OK.")
+        return Response(status_code=status.HTTP_200_OK)
 
     try:
         handler_payload = {"message": {"data": payload_data}}
         handler = GmailWebhookHandler(payload=handler_payload)
-        handler.process()
-
+        handler.decode()
     except Exception as e:
         print(f"Error during webhook processing in API layer: {e}")
+        return Response(status_code=status.HTTP_200_OK)
+
+    if settings.NOTIFICATION_QUEUE_BACKEND == "redis_stream":
+        try:
+            await asyncio.to_thread(notification_stream.publish, payload_data, message_id, handler.email_address)
+        except Exception as e:
+            # Includes StreamBacklogFull: Pub/Sub keeps the message until the workers catch up.
+            print(f"[API] Could not append notification to the stream: {e}. Returning 503 so Pub/Sub retries.")
+            pubsub_deduplicator.forget(message_id)
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        print("[API] Notification appended to the stream. Returning 200 OK to Pub/Sub.")
+        return Response(status_code=status.HTTP_200_OK)
+
+    if not webhook_worker_pool.try_enqueue(handler):
+        print("[API] Worker queue full. Returning 503 so Pub/Sub retries.")
+        pubsub_deduplicator.forget(message_id)
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-    # 3. ALWAYS return a 200 OK to Google Pub/Sub.
-    print("[API] Returning 200 OK to Pub/Sub.") # New log
+    print("[API] Notification queued. Returning 200 OK to Pub/Sub.")
     return Response(status_code=status.HTTP_200_OK)
 
 
-@router.get("/processed-emails", response_model=List[ProcessedEmail], tags=["Webhook"])
-async def get_processed_emails(limit: int = 20):
+@router.get("/gmail-webhook/stats")
+async def gmail_webhook_stats():
+    """
+    Reports queue depth, wait times and outcomes of the background worker pool,
+    plus reuse of the pooled Gmail clients and compiled rule sets.
+    """
+    stats = {
+        **webhook_worker_pool.stats(),
+        "gmail_client_pool": gmail_client_pool.stats(),
+        "rules_cache": rules_cache.stats(),
+        "history_sync": notification_coalescer.stats(),
+        "pubsub_dedup": pubsub_deduplicator.stats(),
+        "rule_evaluation": rule_evaluation_stats.stats(),
+    }
+    if settings.NOTIFICATION_QUEUE_BACKEND == "redis_stream":
+        stats["notification_stream"] = await asyncio.to_thread(notification_stream.stats)
+    return stats
+
+
+@router.get("/processed-emails", response_model=ProcessedEmailPage, tags=["Webhook"])
+async def get_processed_emails(
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    processed_email_service: ProcessedEmailService = Depends(),
+    current_user: User = Depends(get_current_user),
+):
     """
-    Retrieves the latest processed emails and their scores from the database.
+    Retrieves the current user's processed emails and their scores, newest first.
+    Pass the returned `next_after` as `after` to get the next page.
     """
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor.")
 
-    from app.db_utils.mongo import db # Re-add this import
-    results = db.processed_emails.find().sort("_id", -1).limit(limit)
-    return [ProcessedEmail(**r) for r in results]
\ No newline at end of file
+    results = await processed_email_service.get_page(str(current_user._id), limit=limit, after=after)
+    items = [ProcessedEmail(id=str(r.pop("_id")), **r) for r in results]
+    next_after = items[-1].id if len(items) == limit else None
+    return ProcessedEmailPage(items=items, next_after=next_after)
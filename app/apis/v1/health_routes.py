@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.model_registry import model_registry
+
+router = APIRouter()
+
+
+@router.get('/health/live')
+async def liveness():
+    """
+    The HTTP server is up. Does not touch the models, Mongo or Google.
+    """
+    return {"status": "ok"}
+
+
+@router.get('/health/ready')
+async def readiness():
+    """
+    Returns 503 until the models warmed up at startup are loaded.
+    """
+    readiness = model_registry.readiness()
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=readiness)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from app.schemas.email_schema import SummarizeRequest, SummarizeResponse
 from app.services.service_handler import SummarizerHandler
+from app.services.model_registry import model_registry
 
 router = APIRouter()
 
@@ -11,3 +12,11 @@ async def summarize_email(request: SummarizeRequest):
     summary = handle.handle(request.email_index)
     # print(summary)
     return SummarizeResponse(summaries=summary)
+
+
+@router.get('/models/status')
+async def models_status():
+    """
+    Reports load time per model and the resident memory of this process.
+    """
+    return model_registry.stats()
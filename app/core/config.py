@@ -3,6 +3,11 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     MONGO_URI: str
     MONGO_DB_NAME: str = "email_summarizer"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 5
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
 
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
@@ -17,6 +22,109 @@ class Settings(BaseSettings):
     # The URL of the frontend application
     FRONTEND_URL: str
 
+    # Shared Redis used for cross-worker caches
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    REDIS_ENABLED: bool = False
+
+    # Background processing of Gmail push notifications
+    WEBHOOK_WORKER_COUNT: int = 2
+    WEBHOOK_QUEUE_MAX_SIZE: int = 100
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS: float = 30.0
+    # "local" processes notifications in this process's worker pool; "redis_stream"
+    # appends them to a Redis Stream consumed by `python worker.py` on any node
+    NOTIFICATION_QUEUE_BACKEND: str = "local"
+    NOTIFICATION_STREAM: str = "gmail:notifications"
+    NOTIFICATION_CONSUMER_GROUP: str = "notification-workers"
+    NOTIFICATION_DEAD_LETTER_STREAM: str = "gmail:notifications:dead"
+    NOTIFICATION_MAX_DELIVERIES: int = 5
+    # A failed entry is redelivered after this delay, doubled on every further failure
+    NOTIFICATION_RETRY_BACKOFF_MS: int = 5000
+    # Pending entries idle this long are reclaimed from their (presumed dead) consumer;
+    # keep it above the longest history sync
+    NOTIFICATION_CLAIM_IDLE_MS: int = 300000
+    # The webhook answers 503 once a stream holds this many unprocessed notifications; entries are never trimmed
+    NOTIFICATION_STREAM_MAX_LEN: int = 100000
+    NOTIFICATION_WORKER_THREADS: int = 2
+    # Route each user's notifications to the same stream worker by consistent hashing on the email address, so its
+    # credential, Gmail client and rules caches stay warm; redis_stream backend only, since the local pool shares one process
+    NOTIFICATION_SHARDING_ENABLED: bool = False
+    HASH_RING_VIRTUAL_NODES: int = 128
+    # Stream workers heartbeat this often and are considered gone after the timeout
+    WORKER_HEARTBEAT_INTERVAL_SECONDS: float = 5.0
+    WORKER_HEARTBEAT_TIMEOUT_SECONDS: float = 20.0
+
+    # Gmail API client construction and pooling
+    GMAIL_DISCOVERY_CACHE_PATH: str = ".cache/gmail_v1_discovery.json"
+    GMAIL_HTTP_TIMEOUT_SECONDS: float = 30.0
+    GMAIL_CLIENT_POOL_SIZE: int = 256
+    GMAIL_CLIENT_IDLE_TIMEOUT_SECONDS: float = 600.0
+    # "googleapiclient", or "httpx" for the async REST client with per-user limits
+    GMAIL_CLIENT_BACKEND: str = "googleapiclient"
+    # Point at a local fake Gmail server in tests
+    GMAIL_API_BASE_URL: str = "https://gmail.googleapis.com"
+    GMAIL_MAX_CONNECTIONS: int = 100
+    GMAIL_MAX_CONCURRENT_REQUESTS_PER_USER: int = 10
+    # Gmail's per-user limit is 250 quota units per second
+    GMAIL_QUOTA_UNITS_PER_USER_PER_SECOND: float = 250.0
+    GMAIL_MAX_RETRIES: int = 5
+    GMAIL_BACKOFF_BASE_SECONDS: float = 0.5
+    GMAIL_BACKOFF_MAX_SECONDS: float = 32.0
+
+    # Per-user cache of compiled rules
+    RULES_CACHE_MAX_USERS: int = 1024
+    # Expiry used when neither Redis nor Mongo change streams can share invalidations
+    RULES_CACHE_TTL_SECONDS: float = 300.0
+    RULES_CACHE_CHANGE_STREAM_ENABLED: bool = True
+
+    # How long Pub/Sub message IDs are remembered for redelivery deduplication
+    PUBSUB_DEDUP_TTL_SECONDS: int = 3600
+
+    # Per-user single-flight history sync; the Redis lock expires after this long
+    SYNC_LOCK_TTL_SECONDS: int = 600
+
+    # Messages classified between sync checkpoints; a restarted sync redoes at most one batch
+    SYNC_CHECKPOINT_BATCH_SIZE: int = 10
+    # Batches buffered between the history, fetch and classification stages of a sync
+    SYNC_PIPELINE_QUEUE_SIZE: int = 4
+
+    # Load the transformer models during app startup instead of on first use
+    MODEL_WARMUP_ON_STARTUP: bool = False
+
+    # "pytorch", or "onnx" to serve the classifier and summarizer with ONNX Runtime (needs optimum[onnxruntime])
+    INFERENCE_BACKEND: str = "pytorch"
+    # Dynamically quantize the ONNX exports to int8
+    ONNX_QUANTIZE: bool = True
+    ONNX_MODEL_DIR: str = ".cache/onnx"
+
+    # Cross-request micro-batching of zero-shot (premise, rule) pairs
+    INFERENCE_BATCHING_ENABLED: bool = True
+    INFERENCE_MAX_BATCH_SIZE: int = 32
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+
+    # Two-tier scoring: a distilled NLI model scores every pair and only pairs
+    # within CASCADE_UNCERTAINTY_BAND of the match threshold go to bart-large-mnli
+    CASCADE_ENABLED: bool = False
+    CASCADE_SMALL_MODEL: str = "valhalla/distilbart-mnli-12-3"
+    CASCADE_UNCERTAINTY_BAND: float = 0.2
+
+    # Stop scoring rules once an email can no longer reach the storage threshold; sub-rules are only scored when their
+    # parent matches. Only the notification pipeline uses it, so its stored scores can be lower than what /filter/apply
+    # and /filter/run return for the same email, since those count matched sub-rules whatever their parent scored
+    RULE_BRANCH_AND_BOUND_ENABLED: bool = False
+
+    # Embedding-based candidate prefilter ahead of the NLI classifier
+    RULE_PREFILTER_ENABLED: bool = False
+    RULE_PREFILTER_TOP_K: int = 5
+    RULE_PREFILTER_MIN_SIMILARITY: float = 0.3
+    # Fraction of emails also scored exhaustively to measure prefilter recall
+    RULE_PREFILTER_AUDIT_RATE: float = 0.05
+
+    # Content-addressed cache of (email, rule description) scores
+    CLASSIFICATION_CACHE_ENABLED: bool = True
+    CLASSIFICATION_CACHE_MAX_ENTRIES: int = 50000
+    CLASSIFICATION_CACHE_TTL_SECONDS: int = 86400
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -0,0 +1,38 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.db_utils.mongo import db
+
+# collection name -> list of (keys, options)
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    ],
+    "rules": [
+        ([("user_id", ASCENDING)], {"name": "user_id"}),
+    ],
+    "processed_emails": [
+        ([("user_id", ASCENDING), ("message_id", ASCENDING)], {"unique": True, "name": "user_message_unique"}),
+        ([("user_id", ASCENDING), ("_id", DESCENDING)], {"name": "user_latest"}),
+        ([("user_id", ASCENDING), ("aggregated_score", DESCENDING)], {"name": "user_score"}),
+    ],
+}
+
+
+def ensure_indexes(database=db):
+    """
+    Creates the indexes the hot queries rely on. Safe to run on every startup;
+    existing indexes are left as they are. Never raises, so an unreachable
+    database doesn't stop the process from starting.
+    """
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                database[collection_name].create_index(keys, **options)
+            except OperationFailure as e:
+                # Usually duplicate rows written before a unique index existed; they need cleaning up first.
+                print(f"[Indexes] Could not create index '{options['name']}' on {collection_name}: {e}")
+            except PyMongoError as e:
+                # Mongo is down or unreachable; the next startup will try again.
+                print(f"[Indexes] Skipping index creation, database not reachable: {e}")
+                return
@@ -1,7 +1,21 @@
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from app.core.config import settings
 
-client = MongoClient(settings.MONGO_URI)
+_pool_options = dict(
+    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+)
+
+# Async client for request handlers running on the event loop.
+async_client = AsyncIOMotorClient(settings.MONGO_URI, **_pool_options)
+async_db = async_client[settings.MONGO_DB_NAME]
+
+# Sync adapter for background workers and scripts that run outside the event loop.
+client = MongoClient(settings.MONGO_URI, **_pool_options)
 db = client[settings.MONGO_DB_NAME]
 
-rules_collection = db['rules']
\ No newline at end of file
+rules_collection = db['rules']
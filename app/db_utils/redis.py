@@ -7,3 +7,10 @@ redis_client = redis.Redis(
     db=0,
     decode_responses=True
 )
+
+
+def get_redis_client() -> redis.Redis | None:
+    """
+    Returns the shared client, or None when Redis is not configured for this deployment.
+    """
+    return redis_client if settings.REDIS_ENABLED else None
@@ -15,6 +15,8 @@ class RuleModel(BaseModel):
     description: str
     priority: Optional[str] = "low"
     sub_rules: List['RuleModel'] = []
+    # Precomputed sentence embedding of `description`, used by the rule prefilter
+    description_embedding: Optional[List[float]] = None
 
 
     class Config:
@@ -1,12 +1,14 @@
-from pydoc import describe
-
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Optional
 
 class ProcessedEmail(BaseModel):
-    user_id:str = Field(..., description="The ID of the user who owns this email record")
+    id: str = Field(..., description="The ID of the stored record, usable as a pagination cursor")
     message_id: str = Field(..., description="The message ID")
     sender: str = Field(..., description="The sender email")
     subject: str = Field(..., description="The subject")
     snippet: str = Field(..., description="The snippet of the email body")
-    scores: List[Dict] = Field(..., description="The scores of the email body")
\ No newline at end of file
+    aggregated_score: float = Field(..., description="The aggregated rule score of the email")
+
+class ProcessedEmailPage(BaseModel):
+    items: List[ProcessedEmail]
+    next_after: Optional[str] = Field(None, description="Pass as `after` to fetch the next page; null on the last page")
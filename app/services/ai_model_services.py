@@ -1,15 +1,16 @@
-from transformers import pipeline
-from langchain_huggingface import HuggingFacePipeline
-from langchain.prompts import PromptTemplate
+import numpy as np
+
+# transformers, torch and langchain take seconds to import, so they are only
+# imported when a model is actually built.
 
 
 class LangchainSummarizer:
+    model_name = "sshleifer/distilbart-cnn-12-6"
+
     def __init__(self):
-       
-        hf_pipeline = pipeline(
-            task="summarization",
-            model="sshleifer/distilbart-cnn-12-6"
-        )
+        from langchain_huggingface import HuggingFacePipeline
+
+        hf_pipeline = self._build_pipeline()
         self.summarizer = HuggingFacePipeline(
             pipeline=hf_pipeline,
             model_kwargs={
@@ -18,6 +19,14 @@ class LangchainSummarizer:
             }
         )
 
+    def _build_pipeline(self):
+        from transformers import pipeline
+
+        return pipeline(
+            task="summarization",
+            model=self.model_name
+        )
+
     def summarize_email(self, content: str) -> str:
 
         return self.summarizer.invoke(content)
@@ -26,22 +35,121 @@ class LangchainSummarizer:
 
 
 class ZeroShotClassifier:
-    def __init__(self):
-        classification_pipeline = pipeline(
-        task = "zero-shot-classification",
-        model= "facebook/bart-large-mnli"
-        )
+    hypothesis_template = "This example is {}."
+    model_name = "facebook/bart-large-mnli"
+
+    def __init__(self, model_name: str | None = None):
+        from langchain_huggingface import HuggingFacePipeline
+
+        if model_name is not None:
+            self.model_name = model_name
+        classification_pipeline = self._build_pipeline()
         self.classifier = HuggingFacePipeline(
             pipeline=classification_pipeline,
         )
+        self.tokenizer = classification_pipeline.tokenizer
+        self.model = classification_pipeline.model
+
+        label2id = {label.lower(): idx for label, idx in self.model.config.label2id.items()}
+        self.entailment_id = next(idx for label, idx in label2id.items() if label.startswith("entail"))
+        self.contradiction_id = next(idx for label, idx in label2id.items() if label.startswith("contra"))
+
+    @classmethod
+    def cache_namespace(cls) -> str:
+        """
+        Namespace for cached scores; backends whose scores differ must not share one.
+        """
+        return cls.model_name.split("/")[-1]
+
+    def _build_pipeline(self):
+        from transformers import pipeline
+
+        return pipeline(
+            task="zero-shot-classification",
+            model=self.model_name
+        )
 
-    def classify(self , email_content: str, labels: list[str]):
+    def classify(self , email_content: str, labels: list[str], multi_label: bool = False):
         if not email_content or not labels:
             return {'labels': [], 'scores':[]}
         
-        results = self.classifier.pipeline(email_content, candidate_labels=labels)
+        results = self.classifier.pipeline(email_content, candidate_labels=labels, multi_label=multi_label)
         
         return {'labels': results['labels'], 'scores': results['scores']}
+
+    def score_labels(self, email_content: str, labels: list[str]) -> list[float]:
+        """
+        Scores every label against the email in a single pipeline call.
+        Scores are independent (multi_label) and returned in the order of `labels`.
+        """
+        unique_labels = list(dict.fromkeys(labels))
+        results = self.classify(email_content, unique_labels, multi_label=True)
+        scores_by_label = dict(zip(results['labels'], results['scores']))
+        return [scores_by_label.get(label, 0.0) for label in labels]
+
+    def token_lengths(self, pairs: list[tuple[str, str]]) -> list[int]:
+        premises = [premise for premise, _ in pairs]
+        hypotheses = [self.hypothesis_template.format(label) for _, label in pairs]
+        encoded = self.tokenizer(premises, hypotheses, truncation="only_first")
+        return [len(input_ids) for input_ids in encoded["input_ids"]]
+
+    def score_pairs(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """
+        Runs one padded forward pass over (premise, label) pairs that may come
+        from different emails. Returns the multi_label entailment score per pair.
+        """
+        import torch
+
+        if not pairs:
+            return []
+
+        premises = [premise for premise, _ in pairs]
+        hypotheses = [self.hypothesis_template.format(label) for _, label in pairs]
+        inputs = self.tokenizer(
+            premises,
+            hypotheses,
+            padding=True,
+            truncation="only_first",
+            return_tensors="pt",
+        ).to(self.model.device)
+
+        with torch.inference_mode():
+            logits = self.model(**inputs).logits
+
+        entail_contradiction_logits = logits[:, [self.contradiction_id, self.entailment_id]]
+        probabilities = entail_contradiction_logits.softmax(dim=-1)
+        return probabilities[:, 1].tolist()
+
+
+class SentenceEmbedder:
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+        from transformers import AutoModel, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Returns L2-normalised mean-pooled embeddings, one row per text,
+        so cosine similarity is a plain dot product.
+        """
+        import torch
+
+        if not texts:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+        with torch.inference_mode():
+            token_embeddings = self.model(**inputs).last_hidden_state
+
+        mask = inputs["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+        pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        embeddings = pooled.numpy().astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+
 if __name__ == "__main__":
     handler = LangchainSummarizer()
     test_email = (
@@ -2,6 +2,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from cryptography.fernet import Fernet
+from functools import lru_cache
 from typing import Optional
 
 from app.core.config import settings
@@ -11,6 +12,7 @@ from app.services.user_services.handler import UserService
 security = HTTPBearer()
 
 # --- Encryption/Decryption for Google Tokens ---
+@lru_cache(maxsize=1)
 def get_fernet():
     return Fernet(settings.ENCRYPTION_KEY.encode())
 
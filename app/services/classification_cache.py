@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_premise(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class ClassificationCache:
+    """
+    Content-addressed cache of zero-shot scores.
+
+    Keys are a hash of the normalised email text plus a hash of the rule
+    description, so the same newsletter or a retried webhook is not scored
+    twice. Lookups go to an in-process LRU first and then to Redis, which is
+    shared by every worker.
+    """
+    key_prefix = "clf"
+
+    def __init__(self, namespace: str, max_entries: int = 50_000, ttl_seconds: int = 86_400, redis_client=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_client = redis_client
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    def get_many(self, premise: str, descriptions: list[str]) -> dict[str, float]:
+        """
+        Returns the cached score for every description that has one.
+        """
+        premise_hash = _digest(normalize_premise(premise))
+        keys = {description: self._key(premise_hash, description) for description in dict.fromkeys(descriptions)}
+
+        found = {}
+        redis_hits = 0
+        now = time.monotonic()
+        with self._lock:
+            for description, key in keys.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                score, expires_at = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[description] = score
+            self.memory_hits += len(found)
+
+        remaining = [description for description in keys if description not in found]
+        if remaining and self.redis_client is not None:
+            redis_found = self._redis_get([keys[description] for description in remaining])
+            for description, value in zip(remaining, redis_found):
+                if value is not None:
+                    found[description] = float(value)
+                    redis_hits += 1
+            # Promote shared hits into the in-process tier.
+            self._memory_set({keys[description]: found[description] for description in remaining if description in found})
+
+        with self._lock:
+            self.redis_hits += redis_hits
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, premise: str, scores: dict[str, float]):
+        if not scores:
+            return
+        premise_hash = _digest(normalize_premise(premise))
+        entries = {self._key(premise_hash, description): score for description, score in scores.items()}
+        self._memory_set(entries)
+        if self.redis_client is not None:
+            self._redis_set(entries)
+
+    def invalidate_description(self, description: str):
+        """
+        Drops every cached score for a rule description, in both tiers.
+        """
+        description_hash = _digest(description)
+        marker = f":{description_hash}:"
+        with self._lock:
+            stale_keys = [key for key in self._entries if marker in key]
+            for key in stale_keys:
+                del self._entries[key]
+
+        if self.redis_client is None:
+            return
+        try:
+            pattern = f"{self.key_prefix}:{self.namespace}:{description_hash}:*"
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                self.redis_client.unlink(*batch)
+        except Exception as e:
+            self._record_redis_error("invalidate", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.redis_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.redis_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "redis_errors": self.redis_errors,
+            }
+
+    def _key(self, premise_hash: str, description: str) -> str:
+        return f"{self.key_prefix}:{self.namespace}:{_digest(description)}:{premise_hash}"
+
+    def _memory_set(self, entries: dict[str, float]):
+        if not entries:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, score in entries.items():
+                self._entries[key] = (score, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _redis_get(self, keys: list[str]) -> list:
+        try:
+            return self.redis_client.mget(keys)
+        except Exception as e:
+            self._record_redis_error("read", e)
+            return [None] * len(keys)
+
+    def _redis_set(self, entries: dict[str, float]):
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, score in entries.items():
+                pipe.set(key, score, ex=self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            self._record_redis_error("write", e)
+
+    def _record_redis_error(self, operation: str, error: Exception):
+        with self._lock:
+            self.redis_errors += 1
+        print(f"[ClassificationCache] Redis {operation} failed, using in-process tier only: {error}")
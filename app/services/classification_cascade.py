@@ -0,0 +1,59 @@
+import threading
+
+from app.services.ai_model_services import ZeroShotClassifier
+from app.services.inference_batcher import InferenceBatcher
+
+
+class ClassificationCascade:
+    """
+    Two-tier zero-shot scoring.
+
+    A distilled NLI model scores every (email, rule) pair. Only pairs whose
+    score lands within `uncertainty_band` of the match threshold are sent to
+    the large model, whose score then replaces the small one. Pairs that are
+    clearly in or out never pay for a large-model forward pass.
+    """
+    def __init__(self, small_scorer: ZeroShotClassifier | InferenceBatcher, large_scorer: ZeroShotClassifier | InferenceBatcher,
+                 threshold: float = 0.5, uncertainty_band: float = 0.2):
+        self.small_scorer = small_scorer
+        self.large_scorer = large_scorer
+        self.threshold = threshold
+        self.uncertainty_band = uncertainty_band
+
+        self._lock = threading.Lock()
+        self.small_scored = 0
+        self.large_scored = 0
+        self.disagreements = 0
+
+    def score_labels(self, email_content: str, labels: list[str]) -> list[float]:
+        """
+        Same contract as ZeroShotClassifier.score_labels.
+        """
+        unique_labels = list(dict.fromkeys(labels))
+        scores_by_label = dict(zip(unique_labels, self.small_scorer.score_labels(email_content, unique_labels)))
+
+        uncertain = [label for label in unique_labels if abs(scores_by_label[label] - self.threshold) <= self.uncertainty_band]
+        disagreements = 0
+        if uncertain:
+            for label, large_score in zip(uncertain, self.large_scorer.score_labels(email_content, uncertain)):
+                if (large_score >= self.threshold) != (scores_by_label[label] >= self.threshold):
+                    disagreements += 1
+                scores_by_label[label] = large_score
+
+        with self._lock:
+            self.small_scored += len(unique_labels)
+            self.large_scored += len(uncertain)
+            self.disagreements += disagreements
+        return [scores_by_label[label] for label in labels]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "uncertainty_band": self.uncertainty_band,
+                "small_model_pairs": self.small_scored,
+                "large_model_pairs": self.large_scored,
+                "escalation_rate": round(self.large_scored / self.small_scored, 4) if self.small_scored else None,
+                # How often the large model flipped the small model's match decision.
+                "disagreements": self.disagreements,
+                "disagreement_rate": round(self.disagreements / self.large_scored, 4) if self.large_scored else None,
+            }
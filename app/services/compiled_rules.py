@@ -0,0 +1,90 @@
+import hashlib
+from typing import List
+
+import numpy as np
+
+from app.models.rules_model import RuleModel
+
+# Priority codes of the compiled form. Priorities are matched case-insensitively,
+# so "High", "high" and "HIGH" all score the same.
+PRIORITY_LOW = 0
+PRIORITY_MEDIUM = 1
+PRIORITY_HIGH = 2
+PRIORITY_OTHER = 3
+
+PRIORITY_CODES = {"low": PRIORITY_LOW, "medium": PRIORITY_MEDIUM, "high": PRIORITY_HIGH}
+# Points a matched node adds to the aggregated score, indexed by priority code.
+PRIORITY_WEIGHTS = np.array([20.0, 0.0, 30.0, 0.0])
+MAX_SCORE = 100.0
+# A node counts as matched when its zero-shot score reaches this.
+MATCH_THRESHOLD = 0.5
+# Emails whose aggregated score reaches this are stored.
+STORAGE_THRESHOLD = 50.0
+
+
+class CompiledRuleSet:
+    """
+    Flat, array-based form of a user's rule forest.
+
+    Nodes are stored in depth-first order. `parent_indexes[i]` is the index of
+    node i's parent, or -1 for a top-level rule. `subtree_weights[i]` is the
+    most node i and its descendants can add to the score.
+    """
+    def __init__(self, descriptions: List[str], priority_codes: np.ndarray, parent_indexes: np.ndarray, embeddings: List[List[float] | None]):
+        self.descriptions = descriptions
+        self.priority_codes = priority_codes
+        self.parent_indexes = parent_indexes
+        self.embeddings = embeddings
+        self.weights = PRIORITY_WEIGHTS[priority_codes]
+        self.child_indexes = [[] for _ in descriptions]
+        self.subtree_weights = self.weights.copy()
+        # Children always follow their parent in depth-first order, so one reverse pass sums every subtree.
+        for index in range(len(descriptions) - 1, -1, -1):
+            parent = int(parent_indexes[index])
+            if parent >= 0:
+                self.child_indexes[parent].append(index)
+                self.subtree_weights[parent] += self.subtree_weights[index]
+        self.root_indexes = [index for index in range(len(descriptions)) if parent_indexes[index] < 0]
+        self.fingerprint = self._fingerprint()
+
+    @classmethod
+    def from_rules(cls, rules: List[RuleModel]) -> "CompiledRuleSet":
+        descriptions, codes, parents, embeddings = [], [], [], []
+
+        def visit(rule: RuleModel, parent_index: int):
+            index = len(descriptions)
+            descriptions.append(rule.description)
+            codes.append(PRIORITY_CODES.get((rule.priority or "").strip().lower(), PRIORITY_OTHER))
+            parents.append(parent_index)
+            embeddings.append(rule.description_embedding)
+            for sub_rule in rule.sub_rules or []:
+                visit(sub_rule, index)
+
+        for rule in rules:
+            visit(rule, -1)
+
+        return cls(
+            descriptions=descriptions,
+            priority_codes=np.array(codes, dtype=np.int8),
+            parent_indexes=np.array(parents, dtype=np.int32),
+            embeddings=embeddings,
+        )
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def score(self, match_scores: np.ndarray, match_threshold: float) -> float:
+        """
+        Aggregates per-node match scores in one pass: every matched node adds
+        its priority weight, and the total is capped at 100.
+        """
+        if not len(self):
+            return 0.0
+        matched = np.asarray(match_scores) >= match_threshold
+        return float(min(np.dot(matched, self.weights), MAX_SCORE))
+
+    def _fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for description, code, parent in zip(self.descriptions, self.priority_codes.tolist(), self.parent_indexes.tolist()):
+            digest.update(f"{parent}\x1f{code}\x1f{description}\x1e".encode("utf-8"))
+        return digest.hexdigest()
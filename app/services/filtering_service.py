@@ -1,58 +1,218 @@
-from app.services.rules_services import RuleService
+import heapq
+import random
+import threading
+
+import numpy as np
+
+from app.services.rules_services import RuleService, SyncRuleService
 from app.services.ai_model_services import ZeroShotClassifier
+from app.services.inference_batcher import InferenceBatcher
+from app.services.classification_cascade import ClassificationCascade
+from app.services.rule_prefilter import RulePrefilter
+from app.services.classification_cache import ClassificationCache
+from app.services.compiled_rules import CompiledRuleSet, MATCH_THRESHOLD, MAX_SCORE
 from app.models.rules_model import RuleModel
+from app.core.config import settings
 from typing import List, Dict, Optional
 
+class RuleEvaluationStats:
+    """
+    Process-wide counters for branch-and-bound evaluation.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.emails = 0
+        self.nodes = 0
+        self.classifier_calls = 0
+        self.skipped_early = 0
+
+    def record(self, nodes: int, classifier_calls: int, skipped_early: bool):
+        with self._lock:
+            self.emails += 1
+            self.nodes += nodes
+            self.classifier_calls += classifier_calls
+            if skipped_early:
+                self.skipped_early += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            skipped = self.nodes - self.classifier_calls
+            return {
+                "branch_and_bound": settings.RULE_BRANCH_AND_BOUND_ENABLED,
+                "emails": self.emails,
+                "rule_nodes": self.nodes,
+                "classifier_calls": self.classifier_calls,
+                "classifier_calls_skipped": skipped,
+                "skip_rate": round(skipped / self.nodes, 4) if self.nodes else None,
+                # Emails found unable to reach the threshold before every eligible node was scored.
+                "skipped_early": self.skipped_early,
+            }
+
+
+rule_evaluation_stats = RuleEvaluationStats()
+
+
 class EmailFilteringService:
-    def __init__(self, rule_service: RuleService, classifier: ZeroShotClassifier):
+    """
+    Scores emails against a user's rules. `classifier` is anything with
+    `score_labels`: the classifier itself, the shared InferenceBatcher, or a
+    ClassificationCascade that only sends pairs near the match threshold to
+    the large model.
+    """
+    def __init__(self, rule_service: RuleService | SyncRuleService, classifier: ZeroShotClassifier | InferenceBatcher | ClassificationCascade, prefilter: Optional[RulePrefilter] = None, cache: Optional[ClassificationCache] = None):
         self.rule_service = rule_service
         self.classifier = classifier
-        self.individual_match_threshold = 0.5
-
-    def filter_emails_by_rules(self, email_content: str, rules: List[RuleModel]) -> float:
-        overall_score = 0.0
-        
-        for rule in rules:
-            branch_score, high_exists_in_branch, high_matched_in_branch = self._evaluate_rule_branch(email_content, rule)
-            
-            overall_score += branch_score 
-
-        return min(overall_score, 100.0)
-
-    def _evaluate_rule_branch(self, email_content: str, rule: RuleModel) -> (float, bool, bool):
-        score_from_this_rule = 0.0
-        high_priority_exists_in_branch = False
-        high_priority_matched_in_branch = False
-
-        classification_results = self.classifier.classify(email_content, [rule.description])
-        
-        if classification_results and classification_results.get('scores') and len(classification_results['scores']) > 0:
-            match_score = classification_results['scores'][0]
-            is_matched = match_score >= self.individual_match_threshold
-
-            if rule.priority == "High":
-                high_priority_exists_in_branch = True
-                if is_matched:
-                    high_priority_matched_in_branch = True
-                    score_from_this_rule += 30.0
-                else: 
-                    pass
-            elif rule.priority == "Low":
-                if is_matched:
-                    score_from_this_rule += 20.0
-                else:
-                    pass
-            
-        total_branch_score = score_from_this_rule 
-
-        if rule.sub_rules:
-            for sub_rule in rule.sub_rules:
-                sub_score, sub_high_exists, sub_high_matched = self._evaluate_rule_branch(email_content, sub_rule)
-                total_branch_score += sub_score 
-                
-                if sub_high_exists:
-                    high_priority_exists_in_branch = True
-                if sub_high_matched:
-                    high_priority_matched_in_branch = True
-
-        return total_branch_score, high_priority_exists_in_branch, high_priority_matched_in_branch
\ No newline at end of file
+        self.prefilter = prefilter
+        self.cache = cache
+        self.individual_match_threshold = MATCH_THRESHOLD
+
+    def filter_emails_by_rules(self, email_content: str, rules: List[RuleModel] | CompiledRuleSet, decision_threshold: Optional[float] = None) -> float:
+        """
+        Returns the aggregated score of the email against the rules.
+
+        When the caller only stores emails whose score reaches
+        `decision_threshold` and RULE_BRANCH_AND_BOUND_ENABLED is set, the
+        rules are evaluated by branch and bound. Emails that can no longer
+        reach the threshold stop early with a score below it; emails that do
+        reach it are scored exactly, since that score is persisted. Sub-rules
+        then only count when their parent matches, so scores can be lower
+        than the exhaustive path's for the same email.
+        """
+        compiled_rules = rules if isinstance(rules, CompiledRuleSet) else CompiledRuleSet.from_rules(rules)
+        if not len(compiled_rules):
+            return 0.0
+
+        if decision_threshold is not None and settings.RULE_BRANCH_AND_BOUND_ENABLED:
+            candidates = None
+            if self.prefilter is not None:
+                candidates = set(self.prefilter.select_candidates(
+                    email_content,
+                    compiled_rules.descriptions,
+                    compiled_rules.embeddings,
+                ))
+            aggregated_score = self._branch_and_bound(email_content, compiled_rules, decision_threshold, candidates)
+            if candidates is not None and random.random() < settings.RULE_PREFILTER_AUDIT_RATE:
+                self._audit_prefilter(email_content, compiled_rules, candidates)
+            return aggregated_score
+
+        # Score every rule node against the email in one batched NLI call
+        # instead of one classifier invocation per rule and sub-rule.
+        if self.prefilter is None:
+            match_scores = self._score_nodes(email_content, compiled_rules, range(len(compiled_rules)))
+            return compiled_rules.score(match_scores, self.individual_match_threshold)
+
+        candidates = self.prefilter.select_candidates(
+            email_content,
+            compiled_rules.descriptions,
+            compiled_rules.embeddings,
+        )
+        # Rules cut by the prefilter count as not matched.
+        match_scores = self._score_nodes(email_content, compiled_rules, candidates)
+        aggregated_score = compiled_rules.score(match_scores, self.individual_match_threshold)
+
+        if random.random() < settings.RULE_PREFILTER_AUDIT_RATE:
+            self._audit_prefilter(email_content, compiled_rules, set(candidates))
+
+        return aggregated_score
+
+    def _branch_and_bound(self, email_content: str, compiled_rules: CompiledRuleSet, decision_threshold: float, candidates: Optional[set]) -> float:
+        """
+        Scores the rule tree level by level and stops as soon as the email
+        can no longer reach the threshold.
+
+        Following the sub-rule design, a sub-rule is only evaluated once its
+        parent has matched. Each level of the frontier is scored in one
+        batched call. The current score is the lower bound; adding the
+        subtree weights of the frontier gives the upper bound. Once the email
+        is known to be stored, the rest of the tree is scored in one call so
+        the stored score is exact. Nodes whose subtree can add nothing are
+        never scored.
+        """
+        def eligible(index: int) -> bool:
+            return compiled_rules.subtree_weights[index] > 0 and (candidates is None or index in candidates)
+
+        frontier = [index for index in compiled_rules.root_indexes if eligible(index)]
+        reachable_weight = sum(compiled_rules.subtree_weights[index] for index in frontier)
+        score = 0.0
+        classifier_calls = 0
+        skipped_early = False
+
+        while frontier and score < MAX_SCORE:
+            if score + reachable_weight < decision_threshold:
+                skipped_early = True
+                break
+
+            if score >= decision_threshold:
+                # Stored either way: score everything left in one call, then apply the parent gating here.
+                remaining = []
+                stack = list(frontier)
+                while stack:
+                    index = stack.pop()
+                    remaining.append(index)
+                    stack.extend(child for child in compiled_rules.child_indexes[index] if eligible(child))
+                match_scores = self._score_nodes(email_content, compiled_rules, remaining)
+                classifier_calls += len(remaining)
+                stack = list(frontier)
+                while stack:
+                    index = stack.pop()
+                    if match_scores[index] >= self.individual_match_threshold:
+                        score += compiled_rules.weights[index]
+                        stack.extend(child for child in compiled_rules.child_indexes[index] if eligible(child))
+                break
+
+            match_scores = self._score_nodes(email_content, compiled_rules, frontier)
+            classifier_calls += len(frontier)
+            next_frontier = []
+            for index in frontier:
+                reachable_weight -= compiled_rules.subtree_weights[index]
+                if match_scores[index] < self.individual_match_threshold:
+                    continue
+                score += compiled_rules.weights[index]
+                for child in compiled_rules.child_indexes[index]:
+                    if eligible(child):
+                        next_frontier.append(child)
+                        reachable_weight += compiled_rules.subtree_weights[child]
+            frontier = next_frontier
+
+        # Compared against the exhaustive path, which scores every (candidate) node.
+        nodes = len(compiled_rules) if candidates is None else len(candidates)
+        rule_evaluation_stats.record(nodes, classifier_calls, skipped_early)
+        return float(min(score, MAX_SCORE))
+
+    def _audit_prefilter(self, email_content: str, compiled_rules: CompiledRuleSet, candidates: set):
+        exhaustive_scores = self._score_nodes(email_content, compiled_rules, range(len(compiled_rules)))
+        exhaustive_matched = set(np.flatnonzero(exhaustive_scores >= self.individual_match_threshold).tolist())
+        exhaustive_score = compiled_rules.score(exhaustive_scores, self.individual_match_threshold)
+        # What the prefilter would have scored: rules it cut count as not matched.
+        prefiltered_scores = np.zeros(len(compiled_rules))
+        prefiltered_scores[list(candidates)] = exhaustive_scores[list(candidates)]
+        prefiltered_score = compiled_rules.score(prefiltered_scores, self.individual_match_threshold)
+        self.prefilter.record_audit(exhaustive_matched, candidates, score_changed=exhaustive_score != prefiltered_score)
+
+    def _score_nodes(self, email_content: str, compiled_rules: CompiledRuleSet, node_indexes) -> np.ndarray:
+        """
+        Returns a match score per node; nodes not in `node_indexes` score 0.
+        """
+        match_scores = np.zeros(len(compiled_rules))
+        node_indexes = list(node_indexes)
+        if not node_indexes:
+            return match_scores
+
+        descriptions = [compiled_rules.descriptions[idx] for idx in node_indexes]
+        scores_by_description = self._score_descriptions(email_content, descriptions)
+        match_scores[node_indexes] = [scores_by_description[description] for description in descriptions]
+        return match_scores
+
+    def _score_descriptions(self, email_content: str, descriptions: List[str]) -> Dict[str, float]:
+        if self.cache is None or not email_content:
+            scores = self.classifier.score_labels(email_content, descriptions)
+            return dict(zip(descriptions, scores))
+
+        # Only descriptions without a cached score for this email go to the model.
+        scores_by_description = self.cache.get_many(email_content, descriptions)
+        missing = [description for description in dict.fromkeys(descriptions) if description not in scores_by_description]
+        if missing:
+            fresh_scores = dict(zip(missing, self.classifier.score_labels(email_content, missing)))
+            self.cache.set_many(email_content, fresh_scores)
+            scores_by_description.update(fresh_scores)
+        return scores_by_description
@@ -1,6 +1,7 @@
 import base64
 import json
 from app.services.orchestration_service import EmailProcessingOrchestrator # New Import
+from app.services.notification_coalescer import notification_coalescer
 
 class GmailWebhookHandler:
     """
@@ -11,19 +12,38 @@ class GmailWebhookHandler:
         self.payload = payload
         self.message_json = None
 
+    def decode(self) -> dict:
+        """
+        Decodes and validates the payload without doing any processing, so the
+        API layer can reject bad notifications before queueing them.
+        """
+        if self.message_json is None:
+            self._decode_and_validate_message()
+        return self.message_json
+
+    @property
+    def email_address(self) -> str:
+        """
+        The user the notification is for; used to route it to a stream worker shard.
+        """
+        return self.decode()["emailAddress"]
+
     def process(self):
         try:
             print("\n--- [Webhook Handler] Receiving Notification ---")
-            self._decode_and_validate_message()
+            self.decode()
 
             history_id = self.message_json.get("historyId")
             email_address = self.message_json.get("emailAddress")
 
-            # Delegate processing to the Orchestrator
+            # Delegate processing to the Orchestrator, one history sync per user at a time.
             orchestrator = EmailProcessingOrchestrator()
-            orchestrator.process_incoming_email_notification(history_id, email_address)
+            ran = notification_coalescer.submit(email_address, history_id, orchestrator.process_incoming_email_notification)
 
-            print("--- [Webhook Handler] Notification Handled ---")
+            if ran:
+                print("--- [Webhook Handler] Notification Handled ---")
+            else:
+                print(f"--- [Webhook Handler] Sync already running for {email_address}; history ID {history_id} folded into its next run ---")
 
         except ValueError as e:
             print(f"[Webhook Handler] Validation Error: {e}")
@@ -0,0 +1,305 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
+import httpx
+
+from app.core.config import settings
+from app.services.google_services.handler import GmailClient, MessageFetchError, METADATA_FIELDS, is_retryable_error
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# Quota units Gmail charges per call (https://developers.google.com/gmail/api/reference/quota).
+QUOTA_UNITS = {
+    "history.list": 2,
+    "messages.get": 5,
+    "messages.list": 5,
+    "watch": 100,
+}
+
+
+class GmailApiError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Gmail API returned HTTP {status_code}: {message[:500]}")
+        self.status_code = status_code
+        self.body = message
+
+
+class TokenBucket:
+    """
+    Refills at `rate` units per second up to `capacity`; `acquire` waits
+    until enough units are available.
+    """
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, units: float):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= units:
+                    self._tokens -= units
+                    return
+                await asyncio.sleep((units - self._tokens) / self.rate)
+
+
+class _UserLimits:
+    def __init__(self):
+        self.concurrency = asyncio.Semaphore(settings.GMAIL_MAX_CONCURRENT_REQUESTS_PER_USER)
+        self.quota = TokenBucket(settings.GMAIL_QUOTA_UNITS_PER_USER_PER_SECOND)
+
+
+# Shared by every client of the same user while any of them is alive.
+_user_limits = weakref.WeakValueDictionary()
+
+
+class AsyncGmailClient:
+    """
+    Gmail REST client on httpx.
+
+    Calls for one user share a concurrency limit and a token bucket sized in
+    Gmail quota units, and 429/5xx responses are retried with jittered
+    exponential backoff. `base_url` and `http_client` can point the client
+    at a local fake Gmail server.
+    """
+    def __init__(self, credentials: "Credentials", user_key: str, base_url: str | None = None, http_client: httpx.AsyncClient | None = None):
+        self.creds = credentials
+        self.user_key = user_key
+        self.base_url = (base_url or settings.GMAIL_API_BASE_URL).rstrip("/")
+        self.http_client = http_client
+        self.limits = _user_limits.get(user_key)
+        if self.limits is None:
+            self.limits = _user_limits.setdefault(user_key, _UserLimits())
+        self._refresh_lock = asyncio.Lock()
+
+        self.retries = 0
+
+    async def list_history(self, start_history_id: str, page_token: str | None = None) -> dict:
+        params = {"startHistoryId": start_history_id, "historyTypes": "messageAdded", "labelId": "INBOX"}
+        if page_token:
+            params["pageToken"] = page_token
+        return await self._request("GET", "/history", "history.list", params=params)
+
+    async def iter_history_pages(self, start_history_id: str) -> AsyncIterator[list[dict]]:
+        page_token = None
+        while True:
+            response = await self.list_history(start_history_id, page_token)
+            if "history" in response:
+                yield response["history"]
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+    async def get_message(self, message_id: str, format: str = "metadata", metadata_headers: list[str] | None = None, fields: str | None = None) -> dict:
+        params = {"format": format}
+        if metadata_headers:
+            params["metadataHeaders"] = metadata_headers
+        if fields:
+            params["fields"] = fields
+        return await self._request("GET", f"/messages/{message_id}", "messages.get", params=params)
+
+    async def list_messages(self, q: str | None = None, max_results: int = 10) -> dict:
+        params = {"maxResults": max_results}
+        if q:
+            params["q"] = q
+        return await self._request("GET", "/messages", "messages.list", params=params)
+
+    async def watch(self, topic_name: str) -> dict:
+        body = {"labelIds": ["INBOX"], "topicName": topic_name}
+        return await self._request("POST", "/watch", "watch", json=body)
+
+    async def get_emails_by_ids(self, message_ids: list[str], metadata_headers: list[str] | None = None, fields: str = METADATA_FIELDS) -> dict[str, dict]:
+        """
+        Fetches many messages concurrently, within the user's limits.
+        Returns a dict keyed by message ID. As with GmailClient.get_emails_by_ids,
+        messages that no longer exist or fail with another permanent client
+        error are left out, and any that still fail after retries, or are
+        rejected with 401, raise MessageFetchError.
+        """
+        if metadata_headers is None:
+            metadata_headers = ['Subject', 'From']
+
+        unique_ids = list(dict.fromkeys(message_ids))
+        responses = await asyncio.gather(
+            *(self.get_message(message_id, metadata_headers=metadata_headers, fields=fields) for message_id in unique_ids),
+            return_exceptions=True,
+        )
+        results = {}
+        failed = {}
+        for message_id, response in zip(unique_ids, responses):
+            if isinstance(response, GmailApiError) and response.status_code == 404:
+                print(f"[AsyncGmailClient] Message {message_id} no longer exists. Skipping.")
+            elif (isinstance(response, GmailApiError) and 400 <= response.status_code < 500
+                  and response.status_code != 401 and not is_retryable_error(response.status_code, response.body)):
+                print(f"[AsyncGmailClient] Message {message_id} can't be fetched. Skipping: {response}")
+            elif isinstance(response, Exception):
+                failed[message_id] = str(response)
+            else:
+                results[message_id] = response
+        if failed:
+            raise MessageFetchError(results, failed)
+        return results
+
+    async def _request(self, method: str, path: str, quota_method: str, params: dict | None = None, json: dict | None = None) -> dict:
+        url = f"{self.base_url}/gmail/v1/users/me{path}"
+        http_client = self.http_client or _background_loop.http_client()
+        refreshed = False
+        attempt = 0
+        while True:
+            await self.limits.quota.acquire(QUOTA_UNITS[quota_method])
+            async with self.limits.concurrency:
+                headers = {"Authorization": f"Bearer {await self._access_token()}"}
+                try:
+                    response = await http_client.request(method, url, params=params, json=json, headers=headers,
+                                                         timeout=settings.GMAIL_HTTP_TIMEOUT_SECONDS)
+                    status_code = response.status_code
+                except httpx.TransportError as e:
+                    response, status_code = None, None
+                    transport_error = e
+
+            if status_code is not None and status_code < 400:
+                return response.json()
+            if status_code == 401 and not refreshed:
+                # The access token was revoked or expired early; refresh once and retry.
+                refreshed = True
+                await self._refresh_credentials()
+                continue
+            if is_retryable_error(status_code, response.text if response is not None else None) and attempt < settings.GMAIL_MAX_RETRIES:
+                await asyncio.sleep(self._backoff_seconds(attempt, response))
+                attempt += 1
+                self.retries += 1
+                continue
+            if status_code is None:
+                raise transport_error
+            raise GmailApiError(status_code, response.text)
+
+    @staticmethod
+    def _backoff_seconds(attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        # Full jitter, so clients that were throttled together don't retry together.
+        return random.uniform(0, min(settings.GMAIL_BACKOFF_MAX_SECONDS, settings.GMAIL_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    async def _access_token(self) -> str:
+        if not self.creds.valid:
+            await self._refresh_credentials()
+        return self.creds.token
+
+    async def _refresh_credentials(self):
+        async with self._refresh_lock:
+            import google.auth.transport.requests
+            await asyncio.to_thread(self.creds.refresh, google.auth.transport.requests.Request())
+
+
+class _BackgroundLoop:
+    """
+    One event loop on a daemon thread that runs every AsyncGmailClient used
+    from synchronous code, so their per-user limits and the shared httpx
+    connection pool live on a single loop.
+    """
+    def __init__(self):
+        self._loop = None
+        self._http_client = None
+        self._lock = threading.Lock()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=settings.GMAIL_MAX_CONNECTIONS))
+        return self._http_client
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gmail-async-client", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+
+_background_loop = _BackgroundLoop()
+
+
+class AsyncGmailClientBridge:
+    """
+    Synchronous facade over AsyncGmailClient with the same interface as
+    GmailClient, so the orchestrator and the /filter routes can use either.
+    """
+    message_ids_from_events = staticmethod(GmailClient.message_ids_from_events)
+
+    def __init__(self, credentials: "Credentials", user_key: str):
+        self.creds = credentials
+        self.client = _background_loop.run(self._build_client(credentials, user_key))
+
+    @staticmethod
+    async def _build_client(credentials: "Credentials", user_key: str) -> AsyncGmailClient:
+        # Built on the background loop so its limits bind to that loop.
+        return AsyncGmailClient(credentials, user_key)
+
+    def fetch_latest_email_subject(self, max_results: int = 10) -> list[str]:
+        messages = _background_loop.run(self.client.list_messages(max_results=max_results)).get('messages', [])
+        try:
+            messages_by_id = self.get_emails_by_ids([msg['id'] for msg in messages], metadata_headers=['Subject'])
+        except MessageFetchError as e:
+            print(f"[AsyncGmailClient] {e}")
+            messages_by_id = e.fetched
+
+        email_subjects = []
+        for msg in messages:
+            msg_data = messages_by_id.get(msg['id'])
+            if not msg_data:
+                continue
+            headers = msg_data.get('payload', {}).get('headers', [])
+            email_subjects.append(next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject"))
+        return email_subjects
+
+    def get_today_emails(self, max_results: int = 10) -> list[str]:
+        messages = _background_loop.run(self.client.list_messages(q='newer_than:1d', max_results=max_results)).get('messages', [])
+        if not messages:
+            return []
+        try:
+            messages_by_id = self.get_emails_by_ids([message['id'] for message in messages], metadata_headers=[], fields="id,snippet")
+        except MessageFetchError as e:
+            print(f"[AsyncGmailClient] {e}")
+            messages_by_id = e.fetched
+        return [messages_by_id.get(message['id'], {}).get('snippet', '') for message in messages]
+
+    def get_new_message_ids_from_history(self, start_history_id: str) -> list[str]:
+        history_events = [event for page in self.iter_history_pages(start_history_id) for event in page]
+        # The history records are returned oldest first. We want to process the newest first.
+        return list(reversed(self.message_ids_from_events(history_events)))
+
+    def iter_history_pages(self, start_history_id: str) -> Iterator[list[dict]]:
+        page_token = None
+        while True:
+            response = _background_loop.run(self.client.list_history(start_history_id, page_token))
+            if 'history' in response:
+                yield response['history']
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+    def get_email_by_id(self, message_id: str) -> dict:
+        return _background_loop.run(self.client.get_message(message_id, format="full"))
+
+    def get_emails_by_ids(self, message_ids: list[str], metadata_headers: list[str] | None = None, fields: str = METADATA_FIELDS) -> dict[str, dict]:
+        return _background_loop.run(self.client.get_emails_by_ids(message_ids, metadata_headers=metadata_headers, fields=fields))
+
+    def watch(self, topic_name: str) -> dict:
+        print(f"Sending watch request to google for topic: {topic_name}")
+        return _background_loop.run(self.client.watch(topic_name))
@@ -1,31 +1,129 @@
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
 from app.services.auth_services import decrypt_token
 from app.core.config import settings
-import google.oauth2.credentials
-import google.auth.transport.requests
+
+# google-auth is imported on first use, keeping it off the app's startup path.
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Refresh synchronously when the access token has less than this left.
+REFRESH_SKEW_SECONDS = 60
+# Refresh in the background once the token enters this window.
+PROACTIVE_REFRESH_SECONDS = 300
+MAX_CACHED_CREDENTIALS = 1024
+
+
+class _CachedCredentials:
+    def __init__(self, creds: "Credentials"):
+        self.creds = creds
+        # Single-flight: only one refresh per user at a time.
+        self.refresh_lock = threading.Lock()
+
+
 class GoogleAuthHandler:
+    # Shared by every handler instance in the process, keyed by a hash of the
+    # encrypted refresh token so concurrent notifications for one user reuse
+    # the same access token.
+    _credential_cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_hits = 0
+    cache_misses = 0
+
     def __init__(self):
         pass
 
-    def get_credentials_from_refresh_token(self, encrypted_refresh_token: str) -> Credentials:
-        refresh_token = decrypt_token(encrypted_refresh_token)
+    def get_credentials_from_refresh_token(self, encrypted_refresh_token: str) -> "Credentials":
+        cache_key = hashlib.sha256(encrypted_refresh_token.encode()).hexdigest()
+        entry = self._get_or_create_entry(cache_key, encrypted_refresh_token)
+
+        seconds_left = self._seconds_until_expiry(entry.creds)
+        if seconds_left is None or seconds_left <= REFRESH_SKEW_SECONDS:
+            with entry.refresh_lock:
+                # Another caller may have refreshed while we waited for the lock.
+                seconds_left = self._seconds_until_expiry(entry.creds)
+                if seconds_left is None or seconds_left <= REFRESH_SKEW_SECONDS:
+                    self._refresh(entry.creds)
+        elif seconds_left <= PROACTIVE_REFRESH_SECONDS:
+            self._refresh_in_background(entry)
+
+        return entry.creds
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._cache_lock:
+            lookups = cls.cache_hits + cls.cache_misses
+            return {
+                "entries": len(cls._credential_cache),
+                "hits": cls.cache_hits,
+                "misses": cls.cache_misses,
+                "hit_rate": round(cls.cache_hits / lookups, 4) if lookups else None,
+            }
+
+    @classmethod
+    def invalidate(cls, encrypted_refresh_token: str):
+        cache_key = hashlib.sha256(encrypted_refresh_token.encode()).hexdigest()
+        with cls._cache_lock:
+            cls._credential_cache.pop(cache_key, None)
+
+    def _get_or_create_entry(self, cache_key: str, encrypted_refresh_token: str) -> _CachedCredentials:
+        with self._cache_lock:
+            entry = self._credential_cache.get(cache_key)
+            if entry is not None:
+                self._credential_cache.move_to_end(cache_key)
+                GoogleAuthHandler.cache_hits += 1
+                return entry
+            GoogleAuthHandler.cache_misses += 1
+
+            import google.oauth2.credentials
+
+            refresh_token = decrypt_token(encrypted_refresh_token)
+            creds = google.oauth2.credentials.Credentials(
+                None,
+                refresh_token=refresh_token,
+                token_uri="https://oauth2.googleapis.com/token",
+                client_id=settings.GOOGLE_CLIENT_ID,
+                client_secret=settings.GOOGLE_CLIENT_SECRET,
+                scopes=SCOPES
+            )
+            entry = _CachedCredentials(creds)
+            self._credential_cache[cache_key] = entry
+            while len(self._credential_cache) > MAX_CACHED_CREDENTIALS:
+                self._credential_cache.popitem(last=False)
+            return entry
+
+    def _refresh_in_background(self, entry: _CachedCredentials):
+        # Skip if a refresh for this user is already running.
+        if not entry.refresh_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self._refresh(entry.creds)
+            except Exception as e:
+                print(f"[GoogleAuthHandler] Background token refresh failed: {e}")
+            finally:
+                entry.refresh_lock.release()
+
+        threading.Thread(target=refresh, name="google-token-refresh", daemon=True).start()
 
-        creds = google.oauth2.credentials.Credentials(
-            None,
-            refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=settings.GOOGLE_CLIENT_ID,
-            client_secret=settings.GOOGLE_CLIENT_SECRET,
-            scopes=SCOPES
-        )
+    @staticmethod
+    def _refresh(creds: "Credentials"):
+        import google.auth.transport.requests
 
-        # If the credentials are not valid (e.g., expired access token), refresh them.
-        if not creds.valid:
-            if creds.expired and creds.refresh_token:
-                creds.refresh(google.auth.transport.requests.Request())
+        if creds.refresh_token:
+            creds.refresh(google.auth.transport.requests.Request())
 
-        return creds
\ No newline at end of file
+    @staticmethod
+    def _seconds_until_expiry(creds: "Credentials") -> float | None:
+        if not creds.token or creds.expiry is None:
+            return None
+        # google-auth stores expiry as a naive UTC datetime.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (creds.expiry - now).total_seconds()
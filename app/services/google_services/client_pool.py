@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from app.core.config import settings
+from app.services.google_services.handler import GmailClient
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+
+def create_gmail_client(credentials: "Credentials", user_key: str):
+    """
+    Builds the Gmail client selected by GMAIL_CLIENT_BACKEND. Both backends
+    expose the GmailClient interface.
+    """
+    if settings.GMAIL_CLIENT_BACKEND == "httpx":
+        from app.services.google_services.async_client import AsyncGmailClientBridge
+        return AsyncGmailClientBridge(credentials, user_key)
+    if settings.GMAIL_CLIENT_BACKEND != "googleapiclient":
+        raise ValueError(f"Unknown GMAIL_CLIENT_BACKEND '{settings.GMAIL_CLIENT_BACKEND}', expected 'googleapiclient' or 'httpx'.")
+    return GmailClient(credentials)
+
+
+class _PooledClient:
+    def __init__(self, client: GmailClient):
+        self.client = client
+        # httplib2 connections are not thread-safe, so one lease at a time per user.
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class GmailClientPool:
+    """
+    Keeps one ready GmailClient per user so notifications reuse the built
+    service and its keep-alive connection. Clients idle for longer than
+    `idle_timeout_seconds` are dropped, and the least recently used client
+    is evicted when the pool is full.
+    """
+    def __init__(self, max_clients: int = 256, idle_timeout_seconds: float = 600.0):
+        self.max_clients = max_clients
+        self.idle_timeout_seconds = idle_timeout_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def lease(self, user_key: str, credentials_factory: Callable[[], "Credentials"], role: str = "default") -> Iterator[GmailClient]:
+        """
+        Yields the pooled client for `user_key`, building one from
+        `credentials_factory` if there is none. Each `role` gets its own
+        client, so threads that work for the same user concurrently don't
+        share a connection.
+        """
+        entry = self._get_or_create((user_key, role), credentials_factory)
+        with entry.lock:
+            try:
+                yield entry.client
+            finally:
+                entry.last_used = time.monotonic()
+
+    def invalidate(self, user_key: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_key]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _get_or_create(self, key: tuple[str, str], credentials_factory: Callable[[], "Credentials"]) -> _PooledClient:
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Built outside the pool lock: getting credentials may hit the network.
+        new_entry = _PooledClient(create_gmail_client(credentials_factory(), key[0]))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            self._entries[key] = new_entry
+            while len(self._entries) > self.max_clients:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return new_entry
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout_seconds
+        idle_keys = [key for key, entry in self._entries.items() if entry.last_used < cutoff and not entry.lock.locked()]
+        for key in idle_keys:
+            del self._entries[key]
+            self.evictions += 1
+
+
+gmail_client_pool = GmailClientPool(
+    max_clients=settings.GMAIL_CLIENT_POOL_SIZE,
+    idle_timeout_seconds=settings.GMAIL_CLIENT_IDLE_TIMEOUT_SECONDS,
+)
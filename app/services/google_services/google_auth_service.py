@@ -1,7 +1,5 @@
 import httpx
 from urllib.parse import unquote
-from google.oauth2 import id_token
-from google.auth.transport.requests import Request
 
 from app.core.config import settings
 
@@ -46,6 +44,10 @@ class GoogleAuthService:
 
             # --- NEW ---
             # Step 3: Verify the ID token to get the user's profile information.
+            # google-auth is imported here to keep it off the app's startup path.
+            from google.oauth2 import id_token
+            from google.auth.transport.requests import Request
+
             id_info = id_token.verify_oauth2_token(
                 token_payload["id_token"], Request(), settings.GOOGLE_CLIENT_ID
             )
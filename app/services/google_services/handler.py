@@ -1,24 +1,131 @@
 # app/services/google_services/gmail_client.py
 import json
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator
 
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
+from app.core.config import settings
+
+# googleapiclient and httplib2 are imported when a client is built, keeping
+# them off the app's startup path.
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery_document() -> dict:
+    """
+    Returns the parsed Gmail v1 discovery document.
+    It is kept in memory and on disk, so building a client needs no network
+    access and doesn't re-parse the document every time.
+    """
+    global _discovery_document
+    if _discovery_document is not None:
+        return _discovery_document
+
+    with _discovery_lock:
+        if _discovery_document is not None:
+            return _discovery_document
+
+        cache_path = settings.GMAIL_DISCOVERY_CACHE_PATH
+        document = None
+        if os.path.exists(cache_path):
+            with open(cache_path) as cache_file:
+                document = cache_file.read()
+
+        if document is None:
+            # Prefer the copy bundled with google-api-python-client; fall back to fetching it once.
+            try:
+                from googleapiclient.discovery_cache import get_static_doc
+                document = get_static_doc('gmail', 'v1')
+            except ImportError:
+                document = None
+            if document is None:
+                import httplib2
+                response, content = httplib2.Http(timeout=settings.GMAIL_HTTP_TIMEOUT_SECONDS).request(DISCOVERY_URL)
+                if response.status >= 400:
+                    raise RuntimeError(f"Could not fetch the Gmail discovery document (HTTP {response.status}).")
+                document = content.decode("utf-8")
+
+            # Write a temporary file and swap it in, so other processes never read a partial document.
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as cache_file:
+                cache_file.write(document)
+            os.replace(temp_path, cache_path)
+
+        _discovery_document = json.loads(document)
+        return _discovery_document
+
+
+# Gmail allows up to 100 calls per batch request but recommends staying at 50
+# to avoid rate limiting.
+BATCH_REQUEST_SIZE = 50
+METADATA_FIELDS = "id,threadId,snippet,payload/headers"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Gmail reports its per-user and per-project rate limits as 403 with one of these reasons.
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def is_retryable_error(status: int | None, content: bytes | str | None) -> bool:
+    """
+    True for transport errors (no status), 429 and 5xx, and 403s that are rate limits.
+    """
+    if status is None or status in RETRYABLE_STATUS_CODES:
+        return True
+    if status != 403 or not content:
+        return False
+    try:
+        errors = json.loads(content).get("error", {}).get("errors", [])
+        return any(error.get("reason") in RATE_LIMIT_REASONS for error in errors)
+    except (ValueError, AttributeError):
+        return False
+
+
+class MessageFetchError(Exception):
+    """
+    Raised by `get_emails_by_ids` when some messages could not be fetched,
+    even after retrying. `fetched` holds the messages that did arrive and
+    `failed_ids` maps each missing message ID to its last error.
+    """
+    def __init__(self, fetched: dict[str, dict], failed_ids: dict[str, str]):
+        super().__init__(f"Could not fetch {len(failed_ids)} message(s): {', '.join(list(failed_ids)[:5])}")
+        self.fetched = fetched
+        self.failed_ids = failed_ids
 
 
 class GmailClient:
-    def __init__(self, credentials: Credentials):
+    def __init__(self, credentials: "Credentials"):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+
         self.creds = credentials
-        self.service = build('gmail', 'v1', credentials=self.creds)
+        # A dedicated httplib2 connection that stays open for as long as the client is pooled.
+        self.http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=settings.GMAIL_HTTP_TIMEOUT_SECONDS))
+        self.service = build_from_document(get_discovery_document(), http=self.http)
 
     def fetch_latest_email_subject(self, max_results: int = 10) -> list[str]:
         result = self.service.users().messages().list(userId='me', maxResults=max_results).execute()
         messages = result.get('messages', [])
+        try:
+            messages_by_id = self.get_emails_by_ids([msg['id'] for msg in messages], metadata_headers=['Subject'])
+        except MessageFetchError as e:
+            print(f"[GmailClient] {e}")
+            messages_by_id = e.fetched
 
         email_subjects = []
         for msg in messages:
-            msg_data = self.service.users().messages().get(userId='me', id=msg['id'], format='metadata',
-                                                           metadataHeaders=['Subject']).execute()
-            headers = msg_data['payload'].get('headers', [])
+            msg_data = messages_by_id.get(msg['id'])
+            if not msg_data:
+                continue
+            headers = msg_data.get('payload', {}).get('headers', [])
             subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
             email_subjects.append(subject)
 
@@ -36,8 +143,13 @@ class GmailClient:
         email_content = []
         if not messages:
             return []
+        try:
+            messages_by_id = self.get_emails_by_ids([message['id'] for message in messages], metadata_headers=[], fields="id,snippet")
+        except MessageFetchError as e:
+            print(f"[GmailClient] {e}")
+            messages_by_id = e.fetched
         for message in messages:
-            msg_data = self.service.users().messages().get(userId='me', id=message['id']).execute()
+            msg_data = messages_by_id.get(message['id'], {})
             snippet = msg_data.get('snippet', '')
             email_content.append(snippet)
         return email_content
@@ -47,28 +159,28 @@ class GmailClient:
         Fetches all new message IDs from history events since start_history_id.
         """
         history_events = self._get_history_events(start_history_id)
-        message_ids = []
+        message_ids = self.message_ids_from_events(history_events)
 
-        if not history_events:
-            return []
+        # The history records are returned oldest first. We want to process the newest first.
+        return list(reversed(message_ids))
 
+    @staticmethod
+    def message_ids_from_events(history_events: list[dict]) -> list[str]:
+        message_ids = []
         for event in history_events:
             if 'messagesAdded' in event:
                 for message_added in event['messagesAdded']:
                     if 'message' in message_added and 'id' in message_added['message']:
                         message_ids.append(message_added['message']['id'])
-        
-        # The history records are returned oldest first. We want to process the newest first.
-        return list(reversed(message_ids))
+        return message_ids
 
-    def _get_history_events(self, start_history_id: str) -> list[dict]:
+    def iter_history_pages(self, start_history_id: str) -> Iterator[list[dict]]:
         """
-        Fetches history events from the Gmail API, handling pagination.
-        Filters for 'messageAdded' events.
+        Yields the history events page by page, oldest first, as each page
+        arrives. Filters for 'messageAdded' events in the inbox.
         """
-        history_events = []
         page_token = None
-        
+
         while True:
             request_body = {
                 'userId': 'me',
@@ -80,20 +192,99 @@ class GmailClient:
                 request_body['startHistoryId'] = start_history_id
 
             response = self.service.users().history().list(**request_body).execute()
-            
             if 'history' in response:
-                history_events.extend(response['history'])
-            
+                yield response['history']
+
             page_token = response.get('nextPageToken')
             if not page_token:
                 break
-        
-        return history_events
+
+    def _get_history_events(self, start_history_id: str) -> list[dict]:
+        """
+        Fetches history events from the Gmail API, handling pagination.
+        """
+        return [event for page in self.iter_history_pages(start_history_id) for event in page]
 
     def get_email_by_id(self, message_id: str):
         msg_data = self.service.users().messages().get(userId='me', id=message_id).execute()
         return msg_data
 
+    def get_emails_by_ids(self, message_ids: list[str], metadata_headers: list[str] | None = None, fields: str = METADATA_FIELDS) -> dict[str, dict]:
+        """
+        Fetches many messages with batch HTTP requests, asking only for the
+        metadata format, the given headers and the fields in `fields`.
+        Returns a dict keyed by message ID. Messages that no longer exist, or
+        fail with another permanent client error, are left out. Rate-limit and
+        server errors are retried with backoff in smaller batches; any message
+        still failing, or rejected with 401, raises MessageFetchError.
+        """
+        if metadata_headers is None:
+            metadata_headers = ['Subject', 'From']
+
+        results = {}
+        failed = {}
+        pending = list(dict.fromkeys(message_ids))
+        batch_size = BATCH_REQUEST_SIZE
+        attempt = 0
+
+        while pending:
+            retryable = {}
+
+            def on_response(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                    return
+                status = getattr(getattr(exception, "resp", None), "status", None)
+                status = int(status) if status is not None else None
+                if is_retryable_error(status, getattr(exception, "content", None)):
+                    retryable[request_id] = str(exception)
+                elif status == 401:
+                    # The credentials were rejected; skipping would drop every message.
+                    failed[request_id] = str(exception)
+                elif status == 404:
+                    print(f"[GmailClient] Message {request_id} no longer exists. Skipping.")
+                else:
+                    # Permanent for this message, so retrying would hold the user's history ID back forever.
+                    print(f"[GmailClient] Message {request_id} can't be fetched (HTTP {status}). Skipping: {exception}")
+
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for message_id in chunk:
+                    batch.add(
+                        self.service.users().messages().get(
+                            userId='me',
+                            id=message_id,
+                            format='metadata',
+                            metadataHeaders=metadata_headers,
+                            fields=fields,
+                        ),
+                        request_id=message_id,
+                    )
+                try:
+                    batch.execute()
+                except Exception as e:
+                    # The batch request itself failed, so none of its unanswered messages were fetched.
+                    for message_id in chunk:
+                        if message_id not in results and message_id not in failed:
+                            retryable.setdefault(message_id, str(e))
+
+            if not retryable:
+                break
+            if attempt >= settings.GMAIL_MAX_RETRIES:
+                failed.update(retryable)
+                break
+            print(f"[GmailClient] Retrying {len(retryable)} message fetch(es) (attempt {attempt + 1}).")
+            # Full jitter, and smaller batches so the retry doesn't trip the same rate limit.
+            time.sleep(random.uniform(0, min(settings.GMAIL_BACKOFF_MAX_SECONDS, settings.GMAIL_BACKOFF_BASE_SECONDS * 2 ** attempt)))
+            attempt += 1
+            pending = list(retryable)
+            batch_size = max(1, batch_size // 2)
+
+        if failed:
+            raise MessageFetchError(results, failed)
+        return results
+
     def watch(self, topic_name:str):
         request = {
             'labelIds': ['INBOX'],
@@ -0,0 +1,150 @@
+import queue
+import threading
+from contextlib import AbstractContextManager
+from typing import Callable, Iterator
+
+from app.services.google_services.handler import GmailClient, MessageFetchError
+
+# Sentinel a stage puts on its output queue once its input is exhausted.
+_END = object()
+# How often blocked stages check whether the pipeline was abandoned.
+_POLL_SECONDS = 0.2
+
+
+class _StageFailure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class HistorySyncPipeline:
+    """
+    Streams one history sync through three concurrent stages:
+
+    1. history: pages through history.list, drops message IDs already
+       handled and groups the rest into batches;
+    2. fetch: fetches each batch's metadata on a second client, since
+       httplib2 connections are not shared between threads;
+    3. the caller, which iterates `batches()` and classifies them.
+
+    The stages are joined by bounded queues, so Gmail round trips overlap
+    inference and at most `queue_size` batches wait between stages however
+    large the history gap is. Each stage leases its pooled client only
+    while it runs, so the history client is free for other requests as soon
+    as paging ends. Messages that could not be fetched are passed
+    along with their batch rather than dropped, so the caller can hold the
+    history ID back.
+    """
+    def __init__(self, history_client_lease: Callable[[], AbstractContextManager[GmailClient]],
+                 fetch_client_lease: Callable[[], AbstractContextManager[GmailClient]],
+                 start_history_id: str, skip_message_ids: Callable[[list[str]], set],
+                 batch_size: int = 10, queue_size: int = 4, metadata_headers: list[str] | None = None):
+        self.history_client_lease = history_client_lease
+        self.fetch_client_lease = fetch_client_lease
+        self.start_history_id = start_history_id
+        self.skip_message_ids = skip_message_ids
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.metadata_headers = metadata_headers
+
+        self.message_ids_seen = 0
+        self.message_ids_skipped = 0
+
+    def batches(self) -> Iterator[tuple[list[str], dict[str, dict], set[str]]]:
+        """
+        Yields (message IDs, fetched messages by ID, IDs that failed to fetch)
+        per batch, oldest first. IDs in neither were deleted. Any other error
+        in a stage is raised here.
+        """
+        stop = threading.Event()
+        id_batches = queue.Queue(maxsize=self.queue_size)
+        fetched_batches = queue.Queue(maxsize=self.queue_size)
+        stages = [
+            threading.Thread(target=self._run_history_stage, args=(id_batches, stop), name="history-sync-history", daemon=True),
+            threading.Thread(target=self._run_fetch_stage, args=(id_batches, fetched_batches, stop), name="history-sync-fetch", daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        try:
+            while True:
+                item = fetched_batches.get()
+                if item is _END:
+                    return
+                if isinstance(item, _StageFailure):
+                    raise item.error
+                yield item
+        finally:
+            # Also reached when the caller stops early or fails, which unblocks the stages.
+            stop.set()
+            for stage in stages:
+                stage.join()
+
+    def _run_history_stage(self, id_batches: queue.Queue, stop: threading.Event):
+        try:
+            seen = set()
+            pending = []
+            with self.history_client_lease() as history_client:
+                for events in history_client.iter_history_pages(self.start_history_id):
+                    page_ids = [message_id for message_id in dict.fromkeys(GmailClient.message_ids_from_events(events)) if message_id not in seen]
+                    seen.update(page_ids)
+                    self.message_ids_seen += len(page_ids)
+
+                    skip = self.skip_message_ids(page_ids) if page_ids else set()
+                    self.message_ids_skipped += len(skip)
+                    pending.extend(message_id for message_id in page_ids if message_id not in skip)
+
+                    while len(pending) >= self.batch_size:
+                        if not _put(id_batches, pending[:self.batch_size], stop):
+                            return
+                        pending = pending[self.batch_size:]
+
+            if pending and not _put(id_batches, pending, stop):
+                return
+            _put(id_batches, _END, stop)
+        except Exception as e:
+            _put(id_batches, _StageFailure(e), stop)
+
+    def _run_fetch_stage(self, id_batches: queue.Queue, fetched_batches: queue.Queue, stop: threading.Event):
+        try:
+            with self.fetch_client_lease() as fetch_client:
+                while True:
+                    item = _get(id_batches, stop)
+                    if item is None:
+                        return
+                    if item is _END or isinstance(item, _StageFailure):
+                        _put(fetched_batches, item, stop)
+                        return
+                    try:
+                        messages_by_id, failed_ids = fetch_client.get_emails_by_ids(item, metadata_headers=self.metadata_headers), set()
+                    except MessageFetchError as e:
+                        # Keep going: the rest of the sync can still be checkpointed.
+                        messages_by_id, failed_ids = e.fetched, set(e.failed_ids)
+                    if not _put(fetched_batches, (item, messages_by_id, failed_ids), stop):
+                        return
+        except Exception as e:
+            _put(fetched_batches, _StageFailure(e), stop)
+
+
+def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Blocks until `item` is queued; returns False if the pipeline was stopped first.
+    """
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event):
+    """
+    Blocks until an item arrives; returns None if the pipeline was stopped first.
+    """
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return None
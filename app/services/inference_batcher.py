@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.services.ai_model_services import ZeroShotClassifier
+
+
+class InferenceBatcher:
+    """
+    Collects (premise, hypothesis) pairs from concurrent callers and runs them
+    through the classifier as padded batches.
+
+    Pairs are gathered until the collection window is full or `max_wait_ms`
+    has passed since the first pair arrived, sorted by token length so each
+    batch carries little padding, and scored in chunks of `max_batch_size`.
+    Every caller gets one future per pair back.
+    """
+    def __init__(self, classifier: ZeroShotClassifier, max_batch_size: int = 32, max_wait_ms: float = 10.0, window_batches: int = 4):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.window_size = max_batch_size * window_batches
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+
+        self.batches_run = 0
+        self.pairs_scored = 0
+
+    def submit(self, premise: str, hypotheses: list[str]) -> list[Future]:
+        self._ensure_started()
+        futures = []
+        for hypothesis in hypotheses:
+            future = Future()
+            self._queue.put((premise, hypothesis, future))
+            futures.append(future)
+        return futures
+
+    def score_labels(self, email_content: str, labels: list[str]) -> list[float]:
+        """
+        Same contract as ZeroShotClassifier.score_labels, but the pairs share
+        forward passes with whatever other requests are in flight.
+        """
+        if not email_content or not labels:
+            return [0.0 for _ in labels]
+
+        unique_labels = list(dict.fromkeys(labels))
+        futures = self.submit(email_content, unique_labels)
+        scores_by_label = {label: future.result() for label, future in zip(unique_labels, futures)}
+        return [scores_by_label[label] for label in labels]
+
+    def stats(self) -> dict:
+        return {
+            "batches_run": self.batches_run,
+            "pairs_scored": self.pairs_scored,
+            "avg_batch_size": round(self.pairs_scored / self.batches_run, 2) if self.batches_run else 0.0,
+            "queued_pairs": self._queue.qsize(),
+        }
+
+    def stop(self):
+        self._stopped = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            window = [item]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(window) < self.window_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._stopped = True
+                    break
+                window.append(item)
+
+            self._run_window(window)
+
+        # Score whatever was queued before shutdown so no caller is left waiting.
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            self._run_window(leftover)
+
+    def _run_window(self, window: list[tuple]):
+        pending = [entry for entry in window if entry[2].set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        try:
+            lengths = self.classifier.token_lengths([(premise, hypothesis) for premise, hypothesis, _ in pending])
+            pending = [entry for _, entry in sorted(zip(lengths, pending), key=lambda pair: pair[0])]
+        except Exception:
+            # Length sorting only reduces padding; fall back to arrival order.
+            pass
+
+        for start in range(0, len(pending), self.max_batch_size):
+            batch = pending[start:start + self.max_batch_size]
+            try:
+                scores = list(self.classifier.score_pairs([(premise, hypothesis) for premise, hypothesis, _ in batch]))
+                if len(scores) != len(batch):
+                    raise RuntimeError(f"classifier returned {len(scores)} scores for {len(batch)} pairs")
+                self.batches_run += 1
+                self.pairs_scored += len(batch)
+                for (_, _, future), score in zip(batch, scores):
+                    future.set_result(score)
+            except Exception as e:
+                print(f"[InferenceBatcher] Batch of {len(batch)} pairs failed: {e}")
+                # Fail every future still unresolved, so no caller waits forever.
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
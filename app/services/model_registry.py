@@ -0,0 +1,253 @@
+import os
+import resource
+import threading
+import time
+
+from app.core.config import settings
+from app.db_utils.redis import get_redis_client
+from app.services.ai_model_services import LangchainSummarizer, ZeroShotClassifier, SentenceEmbedder
+from app.services.inference_batcher import InferenceBatcher
+from app.services.rule_prefilter import RulePrefilter
+from app.services.classification_cache import ClassificationCache
+from app.services.classification_cascade import ClassificationCascade
+from app.services.compiled_rules import MATCH_THRESHOLD
+
+
+def get_resident_memory_mb() -> float:
+    """
+    Returns the current resident set size of this process in MB.
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """
+    Process-wide owner of the transformer pipelines.
+    Each model is loaded once, on first use or at startup warmup, and then
+    shared by the routers and the orchestrator.
+    """
+    def __init__(self):
+        summarizer_class, classifier_class = self._backend_classes()
+        self._factories = {
+            "summarizer": summarizer_class,
+            "classifier": classifier_class,
+            "small_classifier": lambda: classifier_class(settings.CASCADE_SMALL_MODEL),
+            "embedder": SentenceEmbedder,
+        }
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._batcher = None
+        self._small_batcher = None
+        self._cascade = None
+        self._prefilter = None
+        self._classification_cache = None
+        # "pending" until the startup warmup runs, so readiness fails until the models are loaded.
+        self._warmup_status = "pending" if settings.MODEL_WARMUP_ON_STARTUP else "disabled"
+        self._warmup_error = None
+
+    def get_summarizer(self) -> LangchainSummarizer:
+        return self._get("summarizer")
+
+    def get_classifier(self) -> ZeroShotClassifier:
+        return self._get("classifier")
+
+    def get_rule_scorer(self) -> ZeroShotClassifier | InferenceBatcher | ClassificationCascade:
+        """
+        Returns the object used to score rule descriptions against emails.
+        When batching is enabled the large model is reached through the shared
+        InferenceBatcher, so concurrent requests are scored together. With the
+        cascade enabled a distilled model screens every pair first, through
+        its own batcher when batching is enabled.
+        """
+        large_scorer = self._get_large_scorer()
+        if not settings.CASCADE_ENABLED:
+            return large_scorer
+
+        if self._cascade is None:
+            small_scorer = self._get_small_scorer()
+            with self._lock:
+                if self._cascade is None:
+                    self._cascade = ClassificationCascade(
+                        small_scorer,
+                        large_scorer,
+                        threshold=MATCH_THRESHOLD,
+                        uncertainty_band=settings.CASCADE_UNCERTAINTY_BAND,
+                    )
+        return self._cascade
+
+    def _get_large_scorer(self) -> ZeroShotClassifier | InferenceBatcher:
+        if not settings.INFERENCE_BATCHING_ENABLED:
+            return self.get_classifier()
+
+        if self._batcher is None:
+            classifier = self.get_classifier()
+            with self._lock:
+                if self._batcher is None:
+                    self._batcher = InferenceBatcher(
+                        classifier,
+                        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+                    )
+        return self._batcher
+
+    def _get_small_scorer(self) -> ZeroShotClassifier | InferenceBatcher:
+        if not settings.INFERENCE_BATCHING_ENABLED:
+            return self._get("small_classifier")
+
+        if self._small_batcher is None:
+            small_classifier = self._get("small_classifier")
+            with self._lock:
+                if self._small_batcher is None:
+                    self._small_batcher = InferenceBatcher(
+                        small_classifier,
+                        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+                    )
+        return self._small_batcher
+
+    def get_rule_prefilter(self) -> RulePrefilter | None:
+        if not settings.RULE_PREFILTER_ENABLED:
+            return None
+
+        if self._prefilter is None:
+            embedder = self._get("embedder")
+            with self._lock:
+                if self._prefilter is None:
+                    self._prefilter = RulePrefilter(
+                        embedder,
+                        top_k=settings.RULE_PREFILTER_TOP_K,
+                        min_similarity=settings.RULE_PREFILTER_MIN_SIMILARITY,
+                    )
+        return self._prefilter
+
+    def get_classification_cache(self) -> ClassificationCache | None:
+        if not settings.CLASSIFICATION_CACHE_ENABLED:
+            return None
+
+        if self._classification_cache is None:
+            with self._lock:
+                if self._classification_cache is None:
+                    self._classification_cache = ClassificationCache(
+                        namespace=self._cache_namespace(),
+                        max_entries=settings.CLASSIFICATION_CACHE_MAX_ENTRIES,
+                        ttl_seconds=settings.CLASSIFICATION_CACHE_TTL_SECONDS,
+                        redis_client=get_redis_client(),
+                    )
+        return self._classification_cache
+
+    def _cache_namespace(self) -> str:
+        namespace = self._factories["classifier"].cache_namespace()
+        if settings.CASCADE_ENABLED:
+            # Cascade scores mix both models, so they are cached apart from large-model scores.
+            small_model = settings.CASCADE_SMALL_MODEL.split("/")[-1]
+            namespace = f"{namespace}:cascade:{small_model}:{settings.CASCADE_UNCERTAINTY_BAND}"
+        return namespace
+
+    def shutdown(self):
+        if self._batcher is not None:
+            self._batcher.stop()
+        if self._small_batcher is not None:
+            self._small_batcher.stop()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warmup(self, names: list[str] | None = None):
+        if names is None:
+            names = self.required_models()
+        self._warmup_status = "running"
+        try:
+            for name in names:
+                self._get(name)
+        except Exception as e:
+            self._warmup_status = "failed"
+            self._warmup_error = str(e)
+            raise
+        self._warmup_status = "done"
+
+    def required_models(self) -> list[str]:
+        names = ["summarizer", "classifier"]
+        if settings.CASCADE_ENABLED:
+            names.append("small_classifier")
+        if settings.RULE_PREFILTER_ENABLED:
+            names.append("embedder")
+        return names
+
+    def readiness(self) -> dict:
+        """
+        Reports whether the models needed for summarising and filtering are loaded.
+        Without startup warmup they load on first use, so the process counts as ready.
+        """
+        missing = [name for name in self.required_models() if not self.is_loaded(name)]
+        return {
+            "ready": self._warmup_status == "disabled" or not missing,
+            "warmup": self._warmup_status,
+            "warmup_error": self._warmup_error,
+            "missing_models": missing,
+        }
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": settings.INFERENCE_BACKEND,
+            "models": {name: dict(model_stats) for name, model_stats in self._stats.items()},
+            "resident_memory_mb": round(get_resident_memory_mb(), 1),
+        }
+        if self._batcher is not None:
+            stats["inference_batcher"] = self._batcher.stats()
+        if self._small_batcher is not None:
+            stats["small_inference_batcher"] = self._small_batcher.stats()
+        if self._cascade is not None:
+            stats["classification_cascade"] = self._cascade.stats()
+        if self._classification_cache is not None:
+            stats["classification_cache"] = self._classification_cache.stats()
+        return stats
+
+    @staticmethod
+    def _backend_classes() -> tuple[type, type]:
+        if settings.INFERENCE_BACKEND == "onnx":
+            from app.services.onnx_model_services import OnnxSummarizer, OnnxZeroShotClassifier
+            return OnnxSummarizer, OnnxZeroShotClassifier
+        if settings.INFERENCE_BACKEND != "pytorch":
+            raise ValueError(f"Unknown INFERENCE_BACKEND '{settings.INFERENCE_BACKEND}', expected 'pytorch' or 'onnx'.")
+        return LangchainSummarizer, ZeroShotClassifier
+
+    def _get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have finished loading while we waited.
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            print(f"[ModelRegistry] Loading model '{name}'...")
+            memory_before = get_resident_memory_mb()
+            started = time.perf_counter()
+            model = self._factories[name]()
+            load_seconds = time.perf_counter() - started
+            memory_after = get_resident_memory_mb()
+
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 2),
+                "resident_memory_delta_mb": round(memory_after - memory_before, 1),
+            }
+            self._models[name] = model
+            print(f"[ModelRegistry] Loaded '{name}' in {load_seconds:.2f}s (+{memory_after - memory_before:.0f} MB RSS)")
+            return model
+
+
+model_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return model_registry
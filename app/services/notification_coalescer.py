@@ -0,0 +1,201 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable
+
+from app.core.config import settings
+from app.db_utils.redis import get_redis_client
+
+# Deletes the lock only if it is still ours.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Pushes the lock's expiry out by ARGV[2] milliseconds, only if it is still ours.
+_EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Stores ARGV[1] unless a larger history ID is already pending.
+_FOLD_MAX_SCRIPT = """
+local current = tonumber(redis.call('get', KEYS[1]) or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return 0
+"""
+
+
+class _UserSyncState:
+    def __init__(self):
+        self.running = False
+        self.pending_history_id = None
+
+
+class NotificationCoalescer:
+    """
+    Runs at most one history sync per user at a time.
+
+    Notifications that arrive while a user's sync is running are folded into
+    a single follow-up run for the largest history ID seen. With Redis the
+    guarantee also holds across workers: the sync holds a Redis lock, and
+    history IDs received elsewhere are left in a pending key that the lock
+    holder picks up after it releases the lock. The lock is renewed while
+    the sync runs, so a long catch-up sync keeps it past its TTL, and a
+    worker that dies still lets it expire.
+    """
+    lock_key_prefix = "sync:lock"
+    pending_key_prefix = "sync:pending"
+
+    def __init__(self, redis_client=None, lock_ttl_seconds: int = 600):
+        self.redis_client = redis_client
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self._states = {}
+        self._lock = threading.Lock()
+
+        self.syncs_run = 0
+        self.coalesced = 0
+        self.handed_off = 0
+
+    def submit(self, email_address: str, history_id: str, run_sync: Callable[[str, str], None]) -> bool:
+        """
+        Runs `run_sync(history_id, email_address)` for the user, folding in any
+        notifications that arrive meanwhile. Returns False if the notification
+        was folded into a sync that is already running.
+        """
+        with self._lock:
+            state = self._states.setdefault(email_address, _UserSyncState())
+            state.pending_history_id = max(int(history_id), state.pending_history_id or 0)
+            if state.running:
+                self.coalesced += 1
+                return False
+            state.running = True
+
+        try:
+            while True:
+                with self._lock:
+                    target_history_id = state.pending_history_id
+                    state.pending_history_id = None
+                if target_history_id is None:
+                    return True
+
+                with self._distributed_lock(email_address) as acquired:
+                    if acquired:
+                        target_history_id = max(target_history_id, self._take_remote_pending(email_address))
+                        run_sync(str(target_history_id), email_address)
+                        with self._lock:
+                            self.syncs_run += 1
+                if not acquired:
+                    # Another worker is syncing this user; leave the history ID for it.
+                    self._fold_remote_pending(email_address, target_history_id)
+                    with self._lock:
+                        self.handed_off += 1
+                    # If that worker released the lock meanwhile it may have missed our ID, so take it back and retry.
+                    if self._lock_is_free(email_address):
+                        remote_history_id = self._take_remote_pending(email_address)
+                        if remote_history_id:
+                            with self._lock:
+                                state.pending_history_id = max(remote_history_id, state.pending_history_id or 0)
+                    continue
+
+                # Pick up history IDs other workers handed to us while we held the lock.
+                remote_history_id = self._take_remote_pending(email_address)
+                if remote_history_id:
+                    with self._lock:
+                        state.pending_history_id = max(remote_history_id, state.pending_history_id or 0)
+        finally:
+            with self._lock:
+                state.running = False
+                if state.pending_history_id is None:
+                    self._states.pop(email_address, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active_users": sum(1 for state in self._states.values() if state.running),
+                "syncs_run": self.syncs_run,
+                "coalesced": self.coalesced,
+                "handed_off": self.handed_off,
+                "distributed": self.redis_client is not None,
+            }
+
+    @contextmanager
+    def _distributed_lock(self, email_address: str):
+        if self.redis_client is None:
+            yield True
+            return
+
+        key = f"{self.lock_key_prefix}:{email_address}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = bool(self.redis_client.set(key, token, nx=True, ex=self.lock_ttl_seconds))
+        except Exception as e:
+            # Without Redis we still have the in-process guarantee.
+            print(f"[NotificationCoalescer] Redis lock unavailable, continuing with the local lock only: {e}")
+            yield True
+            return
+
+        stop_renewing = threading.Event()
+        if acquired:
+            threading.Thread(
+                target=self._renew_lock, args=(key, token, email_address, stop_renewing),
+                name="sync-lock-renewal", daemon=True,
+            ).start()
+
+        try:
+            yield acquired
+        finally:
+            stop_renewing.set()
+            if acquired:
+                try:
+                    self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+                except Exception as e:
+                    print(f"[NotificationCoalescer] Failed to release sync lock for {email_address}: {e}")
+
+    def _renew_lock(self, key: str, token: str, email_address: str, stop: threading.Event):
+        # Renew well before expiry, so one failed attempt doesn't lose the lock.
+        while not stop.wait(self.lock_ttl_seconds / 3):
+            try:
+                if not self.redis_client.eval(_EXTEND_LOCK_SCRIPT, 1, key, token, self.lock_ttl_seconds * 1000):
+                    print(f"[NotificationCoalescer] Lost the sync lock for {email_address}; another worker may start a sync.")
+                    return
+            except Exception as e:
+                print(f"[NotificationCoalescer] Failed to renew sync lock for {email_address}: {e}")
+
+    def _fold_remote_pending(self, email_address: str, history_id: int):
+        try:
+            self.redis_client.eval(_FOLD_MAX_SCRIPT, 1, f"{self.pending_key_prefix}:{email_address}", history_id, self.lock_ttl_seconds)
+        except Exception as e:
+            print(f"[NotificationCoalescer] Failed to hand off history ID {history_id} for {email_address}: {e}")
+
+    def _take_remote_pending(self, email_address: str) -> int:
+        if self.redis_client is None:
+            return 0
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            key = f"{self.pending_key_prefix}:{email_address}"
+            pipe.get(key)
+            pipe.delete(key)
+            value, _ = pipe.execute()
+            return int(value or 0)
+        except Exception as e:
+            print(f"[NotificationCoalescer] Failed to read pending history ID for {email_address}: {e}")
+            return 0
+
+    def _lock_is_free(self, email_address: str) -> bool:
+        try:
+            return not self.redis_client.exists(f"{self.lock_key_prefix}:{email_address}")
+        except Exception:
+            return False
+
+
+notification_coalescer = NotificationCoalescer(
+    redis_client=get_redis_client(),
+    lock_ttl_seconds=settings.SYNC_LOCK_TTL_SECONDS,
+)
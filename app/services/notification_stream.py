@@ -0,0 +1,366 @@
+import json
+import threading
+import time
+from typing import Callable
+
+import redis
+
+from app.core.config import settings
+from app.db_utils.redis import redis_client
+from app.services.sharding import ConsistentHashRing
+
+# Pseudo-consumer that holds failed entries, still pending, until their retry delay has passed.
+RETRY_CONSUMER = "retry-backoff"
+
+# Appends to the owner's shard stream only while the owner is a live member, otherwise to the
+# shared stream. Checking membership and appending in one step means nothing lands on a shard
+# stream after its owner was removed and the stream rerouted. Entries are never trimmed: a
+# stream holds only unprocessed notifications, so once it reaches the backlog limit (0 for
+# none) the append is refused and the webhook asks Pub/Sub to redeliver later.
+# KEYS: members set, shard stream, shared stream. ARGV: owner, liveness cutoff, backlog limit, fields...
+_PUBLISH_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local target = KEYS[3]
+if score and tonumber(score) >= tonumber(ARGV[2]) then
+    target = KEYS[2]
+end
+local limit = tonumber(ARGV[3])
+if limit > 0 and redis.call('XLEN', target) >= limit then
+    return redis.error_reply('BACKLOG_FULL ' .. target)
+end
+return redis.call('XADD', target, '*', unpack(ARGV, 4))
+"""
+
+
+class StreamBacklogFull(Exception):
+    pass
+
+
+class NotificationStream:
+    """
+    Durable queue of Gmail notifications on a Redis Stream.
+
+    The webhook appends each notification with XADD and returns; workers
+    started with `python worker.py` on any node read it through one consumer
+    group, so every entry goes to exactly one worker and stays pending until
+    that worker acknowledges it.
+
+    - A failed entry stays pending on the retry consumer and is redelivered
+      after `retry_backoff_ms`, doubling with every failure, so a transient
+      rate limit or database blip doesn't use up its attempts within
+      seconds. It is moved to the dead-letter stream once it has failed
+      `max_deliveries` times.
+    - Entries left pending by a worker that died are reclaimed with XAUTOCLAIM
+      after `claim_idle_ms`; ones that were delivered `max_deliveries` times
+      without being acknowledged are dead-lettered as poison messages.
+
+    With `sharded`, live workers heartbeat into a members set and every
+    worker gets its own stream. The webhook picks the stream by consistent
+    hashing on the email address, so a user's notifications keep landing on
+    the worker whose caches hold that user. When a worker stops heartbeating,
+    another worker re-publishes its leftover entries through the updated ring.
+    The shared stream takes notifications whose owner is not live, including
+    ones routed by a ring that hasn't caught up with a departure yet.
+    """
+    def __init__(self, redis_client: redis.Redis, stream: str, group: str, dead_letter_stream: str,
+                 max_deliveries: int = 5, claim_idle_ms: int = 300_000, max_len: int = 100_000, retry_backoff_ms: int = 5000,
+                 sharded: bool = False, virtual_nodes: int = 128,
+                 heartbeat_interval_seconds: float = 5.0, heartbeat_timeout_seconds: float = 20.0):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        self.max_deliveries = max_deliveries
+        self.claim_idle_ms = claim_idle_ms
+        self.max_len = max_len
+        self.retry_backoff_ms = retry_backoff_ms
+        self.sharded = sharded
+        self.virtual_nodes = virtual_nodes
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self.heartbeat_timeout_seconds = heartbeat_timeout_seconds
+        self.members_key = f"{stream}:workers"
+
+        self._ring = ConsistentHashRing(virtual_nodes=virtual_nodes)
+        self._ring_refreshed_at = 0.0
+        self._publish_script = redis_client.register_script(_PUBLISH_SCRIPT)
+
+        self._lock = threading.Lock()
+        self.published = 0
+        self.processed = 0
+        self.retried = 0
+        self.reclaimed = 0
+        self.dead_lettered = 0
+        self.rerouted = 0
+
+    def shard_stream(self, worker: str) -> str:
+        return f"{self.stream}:shard:{worker}"
+
+    def ensure_group(self, stream: str | None = None):
+        try:
+            self.redis_client.xgroup_create(stream or self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def publish(self, data: str, message_id: str, email_address: str | None = None, attempts: int = 0) -> str:
+        """
+        Appends a notification (the raw base64 Pub/Sub data) to the stream,
+        or to the owning worker's stream when sharded.
+        Raises StreamBacklogFull once the stream holds `max_len` unprocessed
+        notifications, and on Redis errors, so the webhook can ask Pub/Sub to retry.
+        """
+        return self._append(data, message_id, email_address, attempts, self.max_len)
+
+    def _append(self, data: str, message_id: str, email_address: str | None, attempts: int, backlog_limit: int) -> str:
+        fields = {"data": data, "message_id": message_id, "attempts": attempts}
+        if email_address is not None:
+            fields["email_address"] = email_address
+        owner = self._owner(email_address)
+        try:
+            entry_id = self._publish_script(
+                keys=[self.members_key, self.shard_stream(owner) if owner is not None else self.stream, self.stream],
+                args=[owner or "", time.time() - self.heartbeat_timeout_seconds, backlog_limit,
+                      *(value for item in fields.items() for value in item)],
+            )
+        except redis.ResponseError as e:
+            if "BACKLOG_FULL" in str(e):
+                raise StreamBacklogFull(f"{str(e).split()[-1]} already holds {backlog_limit} unprocessed notifications") from e
+            raise
+        with self._lock:
+            self.published += 1
+        return entry_id
+
+    def consume(self, consumer: str, handle: Callable[[str], None], stop: threading.Event, count: int = 1, block_ms: int = 5000,
+                worker: str | None = None):
+        """
+        Reads entries for `consumer` until `stop` is set, passing each entry's
+        data to `handle`. Entries are acknowledged once `handle` returns.
+        Sharded workers read their own stream as well as the shared one.
+        """
+        streams = [self.stream]
+        if self.sharded and worker is not None:
+            streams.insert(0, self.shard_stream(worker))
+        for stream in streams:
+            self.ensure_group(stream)
+
+        next_reclaim = 0.0
+        while not stop.is_set():
+            for stream in streams:
+                for entry_id, fields in self._due_retries(stream, consumer, count):
+                    self._handle_entry(stream, entry_id, fields, handle)
+            if time.monotonic() >= next_reclaim:
+                for stream in streams:
+                    for entry_id, fields in self._reclaim(stream, consumer, count):
+                        self._handle_entry(stream, entry_id, fields, handle)
+                next_reclaim = time.monotonic() + self.claim_idle_ms / 1000 / 2
+
+            try:
+                response = self.redis_client.xreadgroup(self.group, consumer, {stream: ">" for stream in streams}, count=count, block=block_ms)
+            except redis.ResponseError as e:
+                if "NOGROUP" not in str(e):
+                    raise
+                # Our stream was rerouted and deleted while we were presumed dead.
+                for stream in streams:
+                    self.ensure_group(stream)
+                continue
+            for stream, entries in response or []:
+                for entry_id, fields in entries:
+                    self._handle_entry(stream, entry_id, fields, handle)
+
+    def heartbeat(self, worker: str, stop: threading.Event, report: Callable[[], dict] | None = None):
+        """
+        Keeps `worker` in the members set until `stop` is set, publishes its
+        shard stats, and reroutes the streams of workers that stopped
+        heartbeating.
+        """
+        stats_key = f"{self.members_key}:stats:{worker}"
+        while not stop.is_set():
+            try:
+                self.redis_client.zadd(self.members_key, {worker: time.time()})
+                if report is not None:
+                    self.redis_client.set(stats_key, json.dumps(report()), ex=int(self.heartbeat_timeout_seconds * 3))
+                self._reroute_dead_members()
+            except redis.RedisError as e:
+                print(f"[NotificationStream] Heartbeat for {worker} failed: {e}")
+            stop.wait(self.heartbeat_interval_seconds)
+
+    def leave(self, worker: str):
+        """
+        Removes `worker` from the ring and hands its unprocessed entries to the remaining workers.
+        """
+        self.redis_client.zrem(self.members_key, worker)
+        self._reroute(worker)
+
+    def members(self) -> list[str]:
+        cutoff = time.time() - self.heartbeat_timeout_seconds
+        return self.redis_client.zrangebyscore(self.members_key, cutoff, "+inf")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "published": self.published,
+                "processed": self.processed,
+                "retried": self.retried,
+                "reclaimed": self.reclaimed,
+                "rerouted": self.rerouted,
+                "dead_lettered": self.dead_lettered,
+            }
+        try:
+            pending = self.redis_client.xpending(self.stream, self.group)
+            stats.update({
+                "stream_length": self.redis_client.xlen(self.stream),
+                "pending": pending["pending"],
+                "consumers": len(pending.get("consumers") or []),
+                "dead_letter_length": self.redis_client.xlen(self.dead_letter_stream),
+            })
+            if self.sharded:
+                shards = {}
+                for worker in self.members():
+                    report = self.redis_client.get(f"{self.members_key}:stats:{worker}")
+                    shards[worker] = {"stream_length": self.redis_client.xlen(self.shard_stream(worker)), **(json.loads(report) if report else {})}
+                stats["shards"] = shards
+        except redis.RedisError as e:
+            stats["error"] = str(e)
+        return stats
+
+    def _owner(self, email_address: str | None) -> str | None:
+        """
+        The worker whose shard the user hashes to, or None for the shared stream.
+        """
+        if not self.sharded or email_address is None:
+            return None
+        if time.monotonic() - self._ring_refreshed_at >= self.heartbeat_interval_seconds:
+            self._refresh_ring()
+        return self._ring.get_node(email_address)
+
+    def _refresh_ring(self):
+        live_members = set(self.members())
+        if live_members != set(self._ring.nodes):
+            # Swapped in whole, so concurrent publishes never see a half-built ring. The points only
+            # depend on the node names, so workers that stay keep their users.
+            self._ring = ConsistentHashRing(live_members, virtual_nodes=self.virtual_nodes)
+        self._ring_refreshed_at = time.monotonic()
+
+    def _reroute_dead_members(self):
+        cutoff = time.time() - self.heartbeat_timeout_seconds
+        for worker in self.redis_client.zrangebyscore(self.members_key, "-inf", f"({cutoff}"):
+            # Whoever removes the member does the rerouting.
+            if self.redis_client.zrem(self.members_key, worker):
+                print(f"[NotificationStream] Worker {worker} stopped heartbeating; rerouting its entries.")
+                self._reroute(worker)
+
+    def _reroute(self, worker: str):
+        """
+        Re-publishes everything left on `worker`'s stream through the current ring, then deletes the stream.
+        """
+        stream = self.shard_stream(worker)
+        self._refresh_ring()
+        last_id = "-"
+        moved = 0
+        while True:
+            entries = self.redis_client.xrange(stream, min=last_id, max="+", count=100)
+            entries = [(entry_id, fields) for entry_id, fields in entries if entry_id != last_id]
+            if not entries:
+                break
+            for entry_id, fields in entries:
+                # Already accepted from Pub/Sub, so moved regardless of the backlog limit.
+                self._append(fields["data"], fields.get("message_id", ""), fields.get("email_address"), int(fields.get("attempts", 0)), 0)
+                moved += 1
+            last_id = entries[-1][0]
+        self.redis_client.delete(stream)
+        with self._lock:
+            self.rerouted += moved
+        if moved:
+            print(f"[NotificationStream] Rerouted {moved} entr{'y' if moved == 1 else 'ies'} from {worker}.")
+
+    def _handle_entry(self, stream: str, entry_id: str, fields: dict, handle: Callable[[str], None]):
+        try:
+            handle(fields["data"])
+        except Exception as e:
+            # Deliveries on this stream, plus any made before the entry was rerouted here.
+            delivery = self.redis_client.xpending_range(stream, self.group, min=entry_id, max=entry_id, count=1)
+            attempts = int(fields.get("attempts", 0)) + (delivery[0]["times_delivered"] if delivery else 1)
+            if attempts >= self.max_deliveries:
+                self._dead_letter(stream, entry_id, fields, f"failed {attempts} times, last error: {e}")
+                return
+            print(f"[NotificationStream] Entry {entry_id} failed (attempt {attempts}), retrying in {self._retry_delay_ms(attempts) / 1000:.1f}s: {e}")
+            # Hand the entry, still pending, to the retry consumer. JUSTID keeps the delivery count and
+            # resets the idle time, which `_due_retries` compares against the delay.
+            self.redis_client.xclaim(stream, self.group, RETRY_CONSUMER, min_idle_time=0, message_ids=[entry_id], justid=True)
+            with self._lock:
+                self.retried += 1
+            return
+
+        self.redis_client.xack(stream, self.group, entry_id)
+        self.redis_client.xdel(stream, entry_id)
+        with self._lock:
+            self.processed += 1
+
+    def _retry_delay_ms(self, attempts: int) -> int:
+        # Capped below the claim idle time, after which XAUTOCLAIM would take the entry anyway.
+        return min(self.retry_backoff_ms * 2 ** (attempts - 1), self.claim_idle_ms)
+
+    def _due_retries(self, stream: str, consumer: str, count: int) -> list[tuple[str, dict]]:
+        """
+        Claims failed entries whose retry delay has passed for `consumer`.
+        """
+        parked = self.redis_client.xpending_range(stream, self.group, min="-", max="+", count=max(count, 10),
+                                                  consumername=RETRY_CONSUMER, idle=self.retry_backoff_ms)
+        due_ids = [
+            entry["message_id"] for entry in parked
+            if entry["time_since_delivered"] >= self._retry_delay_ms(entry["times_delivered"])
+        ][:count]
+        if not due_ids:
+            return []
+        # Claiming with a minimum idle time means only one consumer wins each entry.
+        claimed = self.redis_client.xclaim(stream, self.group, consumer, min_idle_time=self.retry_backoff_ms, message_ids=due_ids)
+        return [(entry_id, fields) for entry_id, fields in claimed if fields]
+
+    def _reclaim(self, stream: str, consumer: str, count: int) -> list[tuple[str, dict]]:
+        """
+        Takes over entries another consumer left pending for longer than `claim_idle_ms`.
+        """
+        claimed = self.redis_client.xautoclaim(stream, self.group, consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=max(count, 10))
+        entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+        if not entries:
+            return []
+
+        live_entries = []
+        for entry_id, fields in entries:
+            delivery = self.redis_client.xpending_range(stream, self.group, min=entry_id, max=entry_id, count=1)
+            times_delivered = delivery[0]["times_delivered"] if delivery else 1
+            if times_delivered > self.max_deliveries:
+                self._dead_letter(stream, entry_id, fields, f"delivered {times_delivered} times without being acknowledged")
+                continue
+            live_entries.append((entry_id, fields))
+
+        with self._lock:
+            self.reclaimed += len(entries)
+        print(f"[NotificationStream] {consumer} reclaimed {len(entries)} stalled entr{'y' if len(entries) == 1 else 'ies'}.")
+        return live_entries
+
+    def _dead_letter(self, stream: str, entry_id: str, fields: dict, reason: str):
+        print(f"[NotificationStream] Moving entry {entry_id} to {self.dead_letter_stream}: {reason}")
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.xadd(self.dead_letter_stream, {**fields, "original_id": entry_id, "reason": reason[:1000]})
+        pipe.xack(stream, self.group, entry_id)
+        pipe.xdel(stream, entry_id)
+        pipe.execute()
+        with self._lock:
+            self.dead_lettered += 1
+
+
+notification_stream = NotificationStream(
+    redis_client,
+    stream=settings.NOTIFICATION_STREAM,
+    group=settings.NOTIFICATION_CONSUMER_GROUP,
+    dead_letter_stream=settings.NOTIFICATION_DEAD_LETTER_STREAM,
+    max_deliveries=settings.NOTIFICATION_MAX_DELIVERIES,
+    claim_idle_ms=settings.NOTIFICATION_CLAIM_IDLE_MS,
+    max_len=settings.NOTIFICATION_STREAM_MAX_LEN,
+    retry_backoff_ms=settings.NOTIFICATION_RETRY_BACKOFF_MS,
+    sharded=settings.NOTIFICATION_SHARDING_ENABLED,
+    virtual_nodes=settings.HASH_RING_VIRTUAL_NODES,
+    heartbeat_interval_seconds=settings.WORKER_HEARTBEAT_INTERVAL_SECONDS,
+    heartbeat_timeout_seconds=settings.WORKER_HEARTBEAT_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,157 @@
+import os
+import shutil
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ai_model_services import LangchainSummarizer, ZeroShotClassifier
+
+# optimum[onnxruntime] is an optional dependency, only needed with INFERENCE_BACKEND=onnx.
+
+
+def export_onnx_model(model_name: str, ort_model_class, quantize: bool, cache_dir: str) -> str:
+    """
+    Exports `model_name` to ONNX under `cache_dir` and returns the directory to
+    load it from. With `quantize` the weights are also dynamically quantized
+    to int8. Exports are reused on later runs.
+    """
+    from transformers import AutoTokenizer
+
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+    fp32_dir = os.path.join(model_dir, "fp32")
+    if not _has_onnx_files(fp32_dir):
+        print(f"[ONNX] Exporting '{model_name}' to {fp32_dir}...")
+        model = ort_model_class.from_pretrained(model_name, export=True)
+        model.save_pretrained(fp32_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(fp32_dir)
+    if not quantize:
+        return fp32_dir
+
+    int8_dir = os.path.join(model_dir, "int8")
+    if not _has_onnx_files(int8_dir):
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        print(f"[ONNX] Quantizing '{model_name}' to int8 in {int8_dir}...")
+        # Dynamic quantization: int8 weights, activations quantized at run time, no calibration data.
+        quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        os.makedirs(int8_dir, exist_ok=True)
+        for file_name in sorted(os.listdir(fp32_dir)):
+            if file_name.endswith(".onnx"):
+                quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=file_name)
+                quantizer.quantize(save_dir=int8_dir, quantization_config=quantization_config)
+                # Keep the original file names so the directory loads like the fp32 one.
+                stem = file_name[:-len(".onnx")]
+                os.replace(os.path.join(int8_dir, f"{stem}_quantized.onnx"), os.path.join(int8_dir, file_name))
+            elif not file_name.endswith(".onnx_data"):
+                shutil.copy(os.path.join(fp32_dir, file_name), os.path.join(int8_dir, file_name))
+    return int8_dir
+
+
+def _has_onnx_files(directory: str) -> bool:
+    return os.path.isdir(directory) and any(name.endswith(".onnx") for name in os.listdir(directory))
+
+
+def _backend_label() -> str:
+    return "onnx-int8" if settings.ONNX_QUANTIZE else "onnx-fp32"
+
+
+class OnnxZeroShotClassifier(ZeroShotClassifier):
+    """
+    ZeroShotClassifier served by ONNX Runtime instead of PyTorch.
+    The pipeline, tokenizer and scoring code are shared with the PyTorch
+    classifier; only the model object underneath is swapped.
+    """
+    @classmethod
+    def cache_namespace(cls) -> str:
+        # Quantized scores drift slightly, so they must not be served as PyTorch scores.
+        return f"{super().cache_namespace()}:{_backend_label()}"
+
+    def _build_pipeline(self):
+        from transformers import AutoTokenizer, pipeline
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        model_dir = export_onnx_model(
+            self.model_name,
+            ORTModelForSequenceClassification,
+            quantize=settings.ONNX_QUANTIZE,
+            cache_dir=settings.ONNX_MODEL_DIR,
+        )
+        return pipeline(
+            task="zero-shot-classification",
+            model=ORTModelForSequenceClassification.from_pretrained(model_dir),
+            tokenizer=AutoTokenizer.from_pretrained(model_dir),
+        )
+
+
+class OnnxSummarizer(LangchainSummarizer):
+    """
+    LangchainSummarizer served by ONNX Runtime instead of PyTorch.
+    """
+    def _build_pipeline(self):
+        from transformers import AutoTokenizer, pipeline
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        model_dir = export_onnx_model(
+            self.model_name,
+            ORTModelForSeq2SeqLM,
+            quantize=settings.ONNX_QUANTIZE,
+            cache_dir=settings.ONNX_MODEL_DIR,
+        )
+        return pipeline(
+            task="summarization",
+            model=ORTModelForSeq2SeqLM.from_pretrained(model_dir),
+            tokenizer=AutoTokenizer.from_pretrained(model_dir),
+        )
+
+
+# Short emails and rule descriptions used by the parity check.
+PARITY_EMAILS = [
+    "Your invoice #4821 for March is attached. Payment is due within 14 days.",
+    "Hi team, the standup is moved to 10:30 tomorrow because of the all-hands.",
+    "Congratulations! You have been selected to win a free cruise. Click here to claim.",
+    "Your package has shipped and will arrive on Thursday. Track it with the link below.",
+    "Reminder: your dentist appointment is on Friday at 3pm.",
+    "Security alert: a new sign-in to your account was detected from a Windows device.",
+]
+PARITY_LABELS = ["billing", "meeting", "spam", "shipping", "appointment", "security", "newsletter"]
+
+
+def check_parity(reference: ZeroShotClassifier, candidate: ZeroShotClassifier,
+                 emails: list[str] = PARITY_EMAILS, labels: list[str] = PARITY_LABELS,
+                 threshold: float = 0.5) -> dict:
+    """
+    Scores every (email, label) pair with both classifiers and reports how
+    far the candidate's scores drift from the reference, how often the two
+    disagree on the match decision at `threshold`, and the time each took.
+    """
+    pairs = [(email, label) for email in emails for label in labels]
+    # One untimed call each so lazy initialisation doesn't count as latency.
+    reference.score_pairs(pairs[:1])
+    candidate.score_pairs(pairs[:1])
+
+    started = time.perf_counter()
+    reference_scores = np.array(reference.score_pairs(pairs))
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidate_scores = np.array(candidate.score_pairs(pairs))
+    candidate_seconds = time.perf_counter() - started
+
+    differences = np.abs(reference_scores - candidate_scores)
+    agreements = (reference_scores >= threshold) == (candidate_scores >= threshold)
+    return {
+        "pairs": len(pairs),
+        "max_abs_diff": round(float(differences.max()), 4),
+        "mean_abs_diff": round(float(differences.mean()), 4),
+        "decision_agreement": round(float(agreements.mean()), 4),
+        "reference_seconds": round(reference_seconds, 3),
+        "candidate_seconds": round(candidate_seconds, 3),
+        "speedup": round(reference_seconds / candidate_seconds, 2) if candidate_seconds else None,
+    }
+
+
+if __name__ == "__main__":
+    report = check_parity(ZeroShotClassifier(), OnnxZeroShotClassifier())
+    print(f"PyTorch vs {_backend_label()} parity: {report}")
@@ -1,22 +1,37 @@
 from app.services.google_services.auth_handler import GoogleAuthHandler
-from app.services.google_services.handler import GmailClient
-from app.services.ai_model_services import LangchainSummarizer, ZeroShotClassifier
-from app.services.rules_services import RuleService
+from app.services.google_services.handler import MessageFetchError
+from app.services.google_services.client_pool import gmail_client_pool
+from app.services.ai_model_services import LangchainSummarizer
+from app.services.model_registry import ModelRegistry, model_registry as default_model_registry
+from app.services.rules_services import SyncRuleService
 from app.services.filtering_service import EmailFilteringService
+from app.services.compiled_rules import CompiledRuleSet, STORAGE_THRESHOLD
+from app.services.sync_state_service import SyncCheckpoint
+from app.services.history_pipeline import HistorySyncPipeline
+from app.core.config import settings
+from app.services.rules_cache import rules_cache
 from app.db_utils.mongo import db
+from app.services.processed_email_service import ProcessedEmailBuffer
 from app.models.user_model import User
-from app.models.rules_model import RuleModel
 
 class EmailProcessingOrchestrator:
-    def __init__(self):
-        self.ai_summarizer = LangchainSummarizer()
-        self.rule_service = RuleService()
-        self.zero_shot_classifier = ZeroShotClassifier()
+    def __init__(self, model_registry: ModelRegistry = default_model_registry):
+        # Models are owned by the process-wide registry, so building an
+        # orchestrator per notification no longer reloads them from disk.
+        self.model_registry = model_registry
+        self.rule_service = SyncRuleService()
+        self.zero_shot_classifier = self.model_registry.get_rule_scorer()
         self.email_filtering_service = EmailFilteringService(
             rule_service=self.rule_service,
-            classifier=self.zero_shot_classifier
+            classifier=self.zero_shot_classifier,
+            prefilter=self.model_registry.get_rule_prefilter(),
+            cache=self.model_registry.get_classification_cache()
         )
 
+    @property
+    def ai_summarizer(self) -> LangchainSummarizer:
+        return self.model_registry.get_summarizer()
+
     def summarize_by_index(self, email_index: int) -> str:
         # This method is now broken as it relies on a single-user gmail_client
         # It needs to be updated to be user-aware
@@ -42,10 +57,6 @@ class EmailProcessingOrchestrator:
             print(f"[Orchestrator] User {email_address} has no refresh token. Skipping processing.")
             return
 
-        auth_handler = GoogleAuthHandler()
-        credentials = auth_handler.get_credentials_from_refresh_token(user.encrypted_google_refresh_token)
-        gmail_client = GmailClient(credentials)
-
         last_processed_history_id = user.last_processed_history_id
 
         if last_processed_history_id and int(history_id) <= int(last_processed_history_id):
@@ -57,18 +68,72 @@ class EmailProcessingOrchestrator:
             print(f"[Orchestrator] First notification for {email_address}. Storing history ID {history_id}.")
             return
 
-        new_message_ids = gmail_client.get_new_message_ids_from_history(last_processed_history_id)
-        if not new_message_ids:
+        auth_handler = GoogleAuthHandler()
+        credentials_factory = lambda: auth_handler.get_credentials_from_refresh_token(user.encrypted_google_refresh_token)
+        # Each pipeline stage leases its own pooled client only while it runs, so /filter/run for the
+        # same user isn't blocked by the classification that follows history paging.
+        history_client_lease = lambda: gmail_client_pool.lease(email_address, credentials_factory)
+        fetch_client_lease = lambda: gmail_client_pool.lease(email_address, credentials_factory, role="fetch")
+        self._process_history_delta(history_client_lease, fetch_client_lease, user, history_id, last_processed_history_id)
+
+    def _process_history_delta(self, history_client_lease, fetch_client_lease, user: User, history_id: str, last_processed_history_id: str):
+        email_address = user.email
+        user_id = str(user._id)
+        checkpoint = SyncCheckpoint(user_id, last_processed_history_id)
+        processed_emails = ProcessedEmailBuffer(user_id=user_id)
+
+        # Skip messages an interrupted earlier sync already handled, and ones stored by an overlapping delivery.
+        done_message_ids = checkpoint.done_message_ids()
+        skip_message_ids = lambda message_ids: ({message_id for message_id in message_ids if message_id in done_message_ids}
+                                                | processed_emails.existing_message_ids(message_ids))
+
+        compiled_rules = rules_cache.get_or_build(user_id, lambda: self.rule_service.get_all_rules(user_id=user_id))
+
+        pipeline = HistorySyncPipeline(
+            history_client_lease,
+            fetch_client_lease,
+            last_processed_history_id,
+            skip_message_ids,
+            batch_size=settings.SYNC_CHECKPOINT_BATCH_SIZE,
+            queue_size=settings.SYNC_PIPELINE_QUEUE_SIZE,
+            metadata_headers=['Subject', 'From'],
+        )
+        # History paging and message fetches continue in the background while each batch is classified.
+        failed_fetches = {}
+        for batch_ids, messages_by_id, failed_ids in pipeline.batches():
+            failed_fetches.update(dict.fromkeys(failed_ids, "fetch failed after retries"))
+            fetched_ids = [message_id for message_id in batch_ids if message_id not in failed_ids]
+            handled_ids = self._process_message_batch(user_id, fetched_ids, messages_by_id, compiled_rules, processed_emails)
+
+            write_counts = processed_emails.flush()
+            print(f"[Orchestrator] Stored {write_counts['inserted']} email(s), {write_counts['already_present']} already present.")
+            # Only messages that were fetched and classified are durably handled.
+            checkpoint.commit(handled_ids)
+
+        if not pipeline.message_ids_seen:
             print(f"[Orchestrator] No new messages found since history ID {last_processed_history_id}. Acknowledging notification.")
-            db.users.update_one({"email": email_address}, {"$set": {"last_processed_history_id": history_id}})
-            return
+        elif pipeline.message_ids_skipped:
+            print(f"[Orchestrator] Skipped {pipeline.message_ids_skipped} message(s) already handled by an earlier sync.")
 
-        all_rules = self.rule_service.get_all_rules(user_id=str(user._id))
+        if failed_fetches:
+            # Keep the checkpoint and the old history ID, so the redelivered notification fetches only these again.
+            print(f"[Orchestrator] {len(failed_fetches)} message(s) could not be fetched. Not advancing history ID past {last_processed_history_id}.")
+            raise MessageFetchError({}, failed_fetches)
 
-        for message_id in new_message_ids:
-            message_content = gmail_client.get_email_by_id(message_id)
+        checkpoint.complete(email_address, history_id)
+        print("--- [Orchestrator] Finished Processing Notification ---")
+
+    def _process_message_batch(self, user_id: str, message_ids: list[str], messages_by_id: dict[str, dict], compiled_rules: CompiledRuleSet, processed_emails: ProcessedEmailBuffer) -> list[str]:
+        """
+        Classifies the batch and queues the emails to store. Returns the IDs
+        that were classified; messages missing from `messages_by_id` were
+        deleted before they could be fetched.
+        """
+        handled_ids = []
+        for message_id in message_ids:
+            message_content = messages_by_id.get(message_id)
             if not message_content:
-                print(f"[Orchestrator] Could not fetch content for message ID: {message_id}. Skipping.")
+                print(f"[Orchestrator] Message ID {message_id} no longer exists. Skipping.")
                 continue
 
             snippet = message_content.get('snippet', '')
@@ -76,14 +141,18 @@ class EmailProcessingOrchestrator:
             subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "(No Subject)")
             sender = next((h['value'] for h in headers if h['name'] == 'From'), "(No Sender)")
 
-            if not all_rules:
+            if not len(compiled_rules):
                 final_aggregated_score = 0.0
             else:
                 email_full_content = f"Subject: {subject}\n\n{snippet}"
-                final_aggregated_score = self.email_filtering_service.filter_emails_by_rules(email_full_content, all_rules)
+                final_aggregated_score = self.email_filtering_service.filter_emails_by_rules(
+                    email_full_content,
+                    compiled_rules,
+                    decision_threshold=STORAGE_THRESHOLD,
+                )
 
             processed_email_data = {
-                "user_id": str(user._id),
+                "user_id": user_id,
                 "message_id": message_id,
                 "sender": sender,
                 "subject": subject,
@@ -93,12 +162,11 @@ class EmailProcessingOrchestrator:
 
             print(f"[Orchestrator] Processing Email | Subject: '{subject}' | Score: {final_aggregated_score:.2f}%")
 
-            storage_threshold = 50.0
-            if final_aggregated_score >= storage_threshold:
+            if final_aggregated_score >= STORAGE_THRESHOLD:
                 print(f"  - Action: Saving to database.")
-                db.processed_emails.insert_one(processed_email_data)
+                processed_emails.add(processed_email_data)
             else:
-                print(f"  - Action: Skipping (score below {storage_threshold}%).")
+                print(f"  - Action: Skipping (score below {STORAGE_THRESHOLD}%).")
+            handled_ids.append(message_id)
 
-        db.users.update_one({"email": email_address}, {"$set": {"last_processed_history_id": history_id}})
-        print("--- [Orchestrator] Finished Processing Notification ---")
+        return handled_ids
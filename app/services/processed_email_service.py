@@ -0,0 +1,84 @@
+from typing import List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db_utils.mongo import db, async_db
+
+DUPLICATE_KEY_ERROR = 11000
+LIST_PROJECTION = {"message_id": 1, "sender": 1, "subject": 1, "snippet": 1, "aggregated_score": 1}
+
+
+class ProcessedEmailService:
+    def __init__(self):
+        self.collection = async_db.processed_emails
+
+    async def get_page(self, user_id: str, limit: int = 20, after: str | None = None) -> List[dict]:
+        """
+        Returns the user's processed emails newest first, starting after the
+        record with ID `after`. Keyset pagination on (user_id, _id) keeps the
+        cost of every page flat however large the collection grows.
+        """
+        query = {"user_id": user_id}
+        if after is not None:
+            query["_id"] = {"$lt": ObjectId(after)}
+        cursor = self.collection.find(query, LIST_PROJECTION).sort("_id", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+
+class ProcessedEmailBuffer:
+    """
+    Collects the processed emails of one notification and writes them with a
+    single unordered bulk upsert keyed on (user_id, message_id). Rows that
+    already exist, including ones written concurrently by an overlapping
+    delivery, count as already done.
+    """
+    def __init__(self, user_id: str, collection=None):
+        self.user_id = user_id
+        self.collection = collection if collection is not None else db.processed_emails
+        self._pending = {}
+
+    def add(self, processed_email_data: dict):
+        self._pending[processed_email_data["message_id"]] = processed_email_data
+
+    def existing_message_ids(self, message_ids: List[str]) -> set:
+        """
+        Returns the IDs already stored for this user, so callers can skip them before running inference again.
+        """
+        if not message_ids:
+            return set()
+        cursor = self.collection.find(
+            {"user_id": self.user_id, "message_id": {"$in": list(message_ids)}},
+            {"message_id": 1, "_id": 0},
+        )
+        return {doc["message_id"] for doc in cursor}
+
+    def flush(self) -> dict:
+        if not self._pending:
+            return {"inserted": 0, "already_present": 0}
+
+        operations = [
+            UpdateOne(
+                {"user_id": self.user_id, "message_id": message_id},
+                {"$setOnInsert": data},
+                upsert=True,
+            )
+            for message_id, data in self._pending.items()
+        ]
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            counts = {"inserted": result.upserted_count, "already_present": result.matched_count}
+        except BulkWriteError as e:
+            details = e.details
+            other_errors = [error for error in details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR]
+            if other_errors:
+                raise
+            # Lost an upsert race with another delivery of the same message.
+            counts = {
+                "inserted": details.get("nUpserted", 0),
+                "already_present": details.get("nMatched", 0) + len(details.get("writeErrors", [])),
+            }
+
+        self._pending = {}
+        return counts
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.db_utils.redis import get_redis_client
+
+
+class MessageDeduplicator:
+    """
+    Remembers Pub/Sub message IDs for `ttl_seconds` so redeliveries can be
+    dropped in the webhook route before any Mongo, Google or model work.
+    Uses an in-process TTL set, and a shared Redis key per ID when configured.
+    """
+    key_prefix = "pubsub:seen"
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 100_000, redis_client=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_client = redis_client
+
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.checked = 0
+        self.duplicates = 0
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """
+        Records the message ID and returns True if it was already seen.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            self._expire(now)
+            if message_id in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[message_id] = now + self.ttl_seconds
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+
+        if self.redis_client is None:
+            return False
+        try:
+            first_delivery = self.redis_client.set(f"{self.key_prefix}:{message_id}", 1, nx=True, ex=self.ttl_seconds)
+        except Exception as e:
+            print(f"[MessageDeduplicator] Redis unavailable, using the in-process set only: {e}")
+            return False
+        if not first_delivery:
+            with self._lock:
+                self.duplicates += 1
+            return True
+        return False
+
+    def forget(self, message_id: str):
+        """
+        Forgets a message ID so a redelivery is processed, e.g. when the first delivery could not be queued.
+        """
+        with self._lock:
+            self._seen.pop(message_id, None)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(f"{self.key_prefix}:{message_id}")
+            except Exception as e:
+                print(f"[MessageDeduplicator] Failed to forget message {message_id}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked_ids": len(self._seen),
+                "checked": self.checked,
+                "duplicates_dropped": self.duplicates,
+                "duplicate_rate": round(self.duplicates / self.checked, 4) if self.checked else None,
+            }
+
+    def _expire(self, now: float):
+        # Entries are inserted in expiry order, so stop at the first live one.
+        while self._seen:
+            message_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now:
+                break
+            self._seen.popitem(last=False)
+
+
+pubsub_deduplicator = MessageDeduplicator(
+    ttl_seconds=settings.PUBSUB_DEDUP_TTL_SECONDS,
+    redis_client=get_redis_client(),
+)
@@ -0,0 +1,90 @@
+import threading
+
+import numpy as np
+
+from app.services.ai_model_services import SentenceEmbedder
+
+
+class RulePrefilter:
+    """
+    First-stage candidate selection ahead of the NLI cross-encoder.
+
+    The email and every rule description are embedded with a small sentence
+    model and compared by cosine similarity in one matmul. Only the top-k
+    rules, plus any rule above `min_similarity`, are passed on to the
+    zero-shot classifier.
+    """
+    def __init__(self, embedder: SentenceEmbedder, top_k: int = 5, min_similarity: float = 0.3):
+        self.embedder = embedder
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+
+        self._lock = threading.Lock()
+        self.emails_filtered = 0
+        self.rules_seen = 0
+        self.rules_selected = 0
+        self.audited_emails = 0
+        self.exhaustive_matches = 0
+        self.retained_matches = 0
+        self.score_disagreements = 0
+
+    def embed_descriptions(self, descriptions: list[str]) -> list[list[float]]:
+        return self.embedder.embed(descriptions).tolist()
+
+    def select_candidates(self, email_content: str, descriptions: list[str], stored_embeddings: list[list[float] | None]) -> list[int]:
+        """
+        Returns the indexes of the descriptions worth sending to the classifier.
+        Stored embeddings are used where present; missing ones are computed.
+        """
+        if not descriptions:
+            return []
+
+        rule_matrix = self._rule_matrix(descriptions, stored_embeddings)
+        email_vector = self.embedder.embed([email_content])[0]
+        similarities = rule_matrix @ email_vector
+
+        selected = set(np.flatnonzero(similarities >= self.min_similarity).tolist())
+        top_k = min(self.top_k, len(descriptions))
+        if top_k > 0:
+            selected.update(np.argpartition(-similarities, top_k - 1)[:top_k].tolist())
+
+        with self._lock:
+            self.emails_filtered += 1
+            self.rules_seen += len(descriptions)
+            self.rules_selected += len(selected)
+
+        return sorted(selected)
+
+    def record_audit(self, exhaustive_matched: set[int], candidates: set[int], score_changed: bool):
+        """
+        Records one email scored through both the prefiltered and the
+        exhaustive path, to measure the recall of the cut.
+        """
+        with self._lock:
+            self.audited_emails += 1
+            self.exhaustive_matches += len(exhaustive_matched)
+            self.retained_matches += len(exhaustive_matched & candidates)
+            if score_changed:
+                self.score_disagreements += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "emails_filtered": self.emails_filtered,
+                "selection_ratio": round(self.rules_selected / self.rules_seen, 4) if self.rules_seen else None,
+                "audited_emails": self.audited_emails,
+                "exhaustive_matches": self.exhaustive_matches,
+                "retained_matches": self.retained_matches,
+                "recall": round(self.retained_matches / self.exhaustive_matches, 4) if self.exhaustive_matches else None,
+                "score_disagreements": self.score_disagreements,
+            }
+
+    def _rule_matrix(self, descriptions: list[str], stored_embeddings: list[list[float] | None]) -> np.ndarray:
+        missing = [idx for idx, embedding in enumerate(stored_embeddings) if not embedding]
+        computed = self.embedder.embed([descriptions[idx] for idx in missing]) if missing else None
+
+        rows = []
+        computed_rows = iter(computed) if computed is not None else iter(())
+        for embedding in stored_embeddings:
+            rows.append(np.asarray(embedding, dtype=np.float32) if embedding else next(computed_rows))
+        return np.vstack(rows)
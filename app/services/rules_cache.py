@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List
+
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.db_utils.mongo import db
+from app.db_utils.redis import get_redis_client
+from app.models.rules_model import RuleModel
+from app.services.compiled_rules import CompiledRuleSet
+
+
+class RulesCache:
+    """
+    Per-user cache of compiled rule sets, validated by a per-user version
+    counter that RuleService bumps on every create, update and delete.
+
+    Where the counter lives decides how writes on one worker reach the others:
+    - Redis (REDIS_ENABLED): the counter is a Redis key, so a lookup costs one
+      GET instead of a Mongo query and a rebuild.
+    - Mongo change streams (replica sets only): a watcher thread bumps the
+      local counter for every change to the rules collection.
+    - Otherwise the counter is in-process only and entries also expire after
+      `ttl_seconds`, to pick up writes made by other workers.
+    """
+    version_key_prefix = "rules:version"
+
+    def __init__(self, max_users: int = 1024, ttl_seconds: float = 300.0, redis_client=None):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.redis_client = redis_client
+
+        self._entries = OrderedDict()
+        self._local_versions = {}
+        self._lock = threading.Lock()
+
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self._change_stream_active = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def mode(self) -> str:
+        if self.redis_client is not None:
+            return "redis"
+        if self._change_stream_active:
+            return "change_stream"
+        return "local"
+
+    def get_or_build(self, user_id: str, load_rules: Callable[[], List[RuleModel]]) -> CompiledRuleSet:
+        # Read the version before loading so a write racing the load leaves a stale version behind, not stale rules.
+        version = self._current_version(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                cached_version, compiled, expires_at = entry
+                if cached_version == version and version >= 0 and (self.mode != "local" or expires_at > now):
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return compiled
+            self.misses += 1
+
+        compiled = CompiledRuleSet.from_rules(load_rules())
+        with self._lock:
+            self._entries[user_id] = (version, compiled, now + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def bump_version(self, user_id: str):
+        """
+        Marks the user's cached rules as stale on every worker.
+        """
+        with self._lock:
+            self._local_versions[user_id] = self._local_versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.incr(f"{self.version_key_prefix}:{user_id}")
+            except Exception as e:
+                print(f"[RulesCache] Failed to bump shared rules version for {user_id}: {e}")
+
+    def start(self):
+        """
+        Starts the change-stream watcher when Redis is not used and the
+        Mongo deployment supports change streams.
+        """
+        if self.redis_client is not None or not settings.RULES_CACHE_CHANGE_STREAM_ENABLED or self._watcher is not None:
+            return
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(target=self._watch_rules, name="rules-cache-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "users": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    def _current_version(self, user_id: str) -> int:
+        if self.redis_client is not None:
+            try:
+                return int(self.redis_client.get(f"{self.version_key_prefix}:{user_id}") or 0)
+            except Exception as e:
+                print(f"[RulesCache] Failed to read shared rules version for {user_id}, reloading: {e}")
+                return -1
+        with self._lock:
+            return self._local_versions.get(user_id, 0)
+
+    def _watch_rules(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        try:
+            with db.rules.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+                self._change_stream_active = True
+                print("[RulesCache] Watching the rules collection for changes.")
+                while not self._watcher_stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        self._apply_change(change)
+        except PyMongoError as e:
+            print(f"[RulesCache] Change streams unavailable, falling back to TTL expiry: {e}")
+        finally:
+            self._change_stream_active = False
+
+    def _apply_change(self, change: dict):
+        user_id = (change.get("fullDocument") or {}).get("user_id")
+        if user_id is not None:
+            with self._lock:
+                self._local_versions[user_id] = self._local_versions.get(user_id, 0) + 1
+            return
+
+        # Deletes don't carry the document, so the owner is unknown: drop everything.
+        with self._lock:
+            for cached_user_id in list(self._entries):
+                self._local_versions[cached_user_id] = self._local_versions.get(cached_user_id, 0) + 1
+
+
+rules_cache = RulesCache(
+    max_users=settings.RULES_CACHE_MAX_USERS,
+    ttl_seconds=settings.RULES_CACHE_TTL_SECONDS,
+    redis_client=get_redis_client(),
+)
@@ -1,58 +1,139 @@
+import asyncio
+
 from bson import ObjectId
 from typing import List
 
-from app.db_utils.mongo import db
+from app.db_utils.mongo import db, async_db
 from app.models.rules_model import RuleModel
 from app.schemas.rules_schema import RuleCreate, RuleUpdate
+from app.core.config import settings
+from app.services.rules_cache import rules_cache
 
 
-class RuleService:
+def _to_rule_model(rule_data: dict) -> RuleModel:
+    rule_data['_id'] = str(rule_data['_id'])
+    return RuleModel(**rule_data)
+
+
+class SyncRuleService:
+    """
+    Blocking read access to rules for background workers, which run outside
+    the event loop and use the sync Mongo adapter.
+    """
     def __init__(self):
         self.collection = db['rules']
 
     def get_all_rules(self, user_id: str) -> List[RuleModel]:
+        return [_to_rule_model(rule) for rule in self.collection.find({"user_id": user_id})]
+
+    def get_rule_by_id(self, rule_id: str, user_id: str) -> RuleModel | None:
+        rule_data = self.collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+        if rule_data:
+            return _to_rule_model(rule_data)
+        return None
+
+
+class RuleService:
+    def __init__(self):
+        self.collection = async_db['rules']
+
+    async def get_all_rules(self, user_id: str) -> List[RuleModel]:
         rules_cursor = self.collection.find({"user_id": user_id})
         rules = []
-        for rule in rules_cursor:
-            rule['_id'] = str(rule['_id'])
-            rules.append(RuleModel(**rule))
+        async for rule in rules_cursor:
+            rules.append(_to_rule_model(rule))
         return rules
 
-    def get_rule_by_id(self, rule_id: str, user_id: str) -> RuleModel | None:
-        rule_data = self.collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+    async def get_rule_by_id(self, rule_id: str, user_id: str) -> RuleModel | None:
+        rule_data = await self.collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
         if rule_data:
-            rule_data['_id'] = str(rule_data['_id'])
-            return RuleModel(**rule_data)
+            return _to_rule_model(rule_data)
         return None
 
-    def create_rule(self, rule: RuleCreate, user_id: str) -> RuleModel | None:
+    async def create_rule(self, rule: RuleCreate, user_id: str) -> RuleModel | None:
         rule_data = rule.model_dump()
         rule_data["user_id"] = user_id  # Add user_id to the rule
-        result = self.collection.insert_one(rule_data)
-        new_rule = self.collection.find_one({"_id": result.inserted_id, "user_id": user_id})
+        # Embedding is model inference, so keep it off the event loop.
+        await asyncio.to_thread(self._attach_description_embeddings, rule_data)
+        result = await self.collection.insert_one(rule_data)
+        await asyncio.to_thread(rules_cache.bump_version, user_id)
+        new_rule = await self.collection.find_one({"_id": result.inserted_id, "user_id": user_id})
         if new_rule:
-            new_rule['_id'] = str(new_rule['_id'])
-            return RuleModel(**new_rule)
+            return _to_rule_model(new_rule)
         return None
 
-    def update_rule(self, rule_id: str, rule: RuleUpdate, user_id: str) -> RuleModel | None:
+    async def update_rule(self, rule_id: str, rule: RuleUpdate, user_id: str) -> RuleModel | None:
         obj_id = ObjectId(rule_id)
         updated_data = rule.model_dump(exclude_unset=True)
         
         # Ensure the user can only update their own rule
-        existing_rule = self.collection.find_one({"_id": obj_id, "user_id": user_id})
+        existing_rule = await self.collection.find_one({"_id": obj_id, "user_id": user_id})
         if not existing_rule:
             return None # Or raise HTTPException
 
         if not updated_data:
-            return self.get_rule_by_id(rule_id, user_id)
+            return await self.get_rule_by_id(rule_id, user_id)
 
-        self.collection.update_one(
+        if "description" in updated_data or "sub_rules" in updated_data:
+            await asyncio.to_thread(self._attach_description_embeddings, updated_data)
+
+        update = {'$set': updated_data}
+        if "description" in updated_data and "description_embedding" not in updated_data:
+            # The prefilter is off, so no new embedding was computed; don't leave a stale one behind.
+            update['$unset'] = {"description_embedding": ""}
+
+        await self.collection.update_one(
             {"_id": obj_id, "user_id": user_id},
-            {'$set': updated_data}
+            update
         )
-        return self.get_rule_by_id(rule_id, user_id)
+        await asyncio.to_thread(rules_cache.bump_version, user_id)
+        updated_rule = await self.get_rule_by_id(rule_id, user_id)
+        if updated_rule and ("description" in updated_data or "sub_rules" in updated_data):
+            await asyncio.to_thread(self._invalidate_cached_scores, existing_rule, updated_rule.model_dump())
+        return updated_rule
+
+    async def delete_rule(self, rule_id: str, user_id: str) -> bool:
+        result = await self.collection.delete_one({"_id": ObjectId(rule_id), "user_id": user_id})
+        await asyncio.to_thread(rules_cache.bump_version, user_id)
+        return result.deleted_count > 0
+
+    def _attach_description_embeddings(self, rule_data: dict):
+        """
+        Stores the prefilter embedding of each description alongside the rule
+        (and its sub-rules) so scoring doesn't have to re-embed them.
+        """
+        if not settings.RULE_PREFILTER_ENABLED:
+            return
+
+        from app.services.model_registry import model_registry
+        prefilter = model_registry.get_rule_prefilter()
+
+        nodes = []
+        def collect(node: dict):
+            if node.get("description"):
+                nodes.append(node)
+            for sub_rule in node.get("sub_rules") or []:
+                collect(sub_rule)
+        collect(rule_data)
+
+        embeddings = prefilter.embed_descriptions([node["description"] for node in nodes])
+        for node, embedding in zip(nodes, embeddings):
+            node["description_embedding"] = embedding
+
+    def _invalidate_cached_scores(self, old_rule: dict, new_rule: dict):
+        """
+        Drops cached classification scores for descriptions that no longer exist in the rule tree.
+        """
+        from app.services.model_registry import model_registry
+        cache = model_registry.get_classification_cache()
+        if cache is None:
+            return
+
+        for description in self._collect_descriptions(old_rule) - self._collect_descriptions(new_rule):
+            cache.invalidate_description(description)
 
-    def delete_rule(self, rule_id: str, user_id: str) -> bool:
-        result = self.collection.delete_one({"_id": ObjectId(rule_id), "user_id": user_id})
-        return result.deleted_count > 0
\ No newline at end of file
+    def _collect_descriptions(self, rule_data: dict) -> set:
+        descriptions = {rule_data["description"]} if rule_data.get("description") else set()
+        for sub_rule in rule_data.get("sub_rules") or []:
+            descriptions |= self._collect_descriptions(sub_rule)
+        return descriptions
@@ -0,0 +1,50 @@
+import bisect
+import hashlib
+from typing import Iterable
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to nodes with consistent hashing. Every node owns
+    `virtual_nodes` points on the ring, so keys spread evenly, and adding or
+    removing a node only moves the keys on that node's arcs.
+    """
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = 128):
+        self.virtual_nodes = virtual_nodes
+        self._ring = []
+        self._hashes = []
+        self._nodes = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> list[str]:
+        return sorted(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add_node(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.virtual_nodes):
+            bisect.insort(self._ring, (self._hash(f"{node}#{replica}"), node))
+        self._hashes = [point for point, _ in self._ring]
+
+    def remove_node(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._ring = [(point, owner) for point, owner in self._ring if owner != node]
+        self._hashes = [point for point, _ in self._ring]
+
+    def get_node(self, key: str) -> str | None:
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
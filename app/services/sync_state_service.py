@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from typing import Iterable
+
+from app.db_utils.mongo import db
+
+
+class SyncCheckpoint:
+    """
+    Progress of one user's history sync, kept in the `sync_state` collection
+    so a sync interrupted by a crash or deploy resumes where it stopped.
+
+    The document records the history ID the sync started from and every
+    message ID already handled from that starting point, whether or not the
+    email scored high enough to be stored. A later sync from the same
+    starting point skips those messages. Once all messages are handled the
+    user's `last_processed_history_id` advances and the document is removed.
+    """
+    def __init__(self, user_id: str, start_history_id: str, database=db):
+        self.user_id = user_id
+        self.start_history_id = str(start_history_id)
+        self.collection = database.sync_state
+        self.users = database.users
+
+    def done_message_ids(self) -> set:
+        """
+        Message IDs handled by an earlier, unfinished sync from the same starting point.
+        """
+        state = self.collection.find_one({"_id": self.user_id})
+        if not state or state.get("start_history_id") != self.start_history_id:
+            # No earlier attempt, or one from a history ID that has since been passed.
+            return set()
+        return set(state.get("done_message_ids", []))
+
+    def commit(self, message_ids: Iterable[str]):
+        """
+        Records messages as handled. Call only after their processed emails are flushed.
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return
+        # Drop state left by a sync from another starting point before adding to it.
+        self.collection.delete_one({"_id": self.user_id, "start_history_id": {"$ne": self.start_history_id}})
+        self.collection.update_one(
+            {"_id": self.user_id},
+            {
+                "$set": {"start_history_id": self.start_history_id, "updated_at": datetime.now(timezone.utc)},
+                "$addToSet": {"done_message_ids": {"$each": message_ids}},
+            },
+            upsert=True,
+        )
+
+    def complete(self, email_address: str, history_id: str):
+        """
+        Advances the user's history ID and clears the checkpoint.
+        """
+        self.users.update_one({"email": email_address}, {"$set": {"last_processed_history_id": history_id}})
+        self.collection.delete_one({"_id": self.user_id})
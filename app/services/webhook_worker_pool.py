@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services.gmail_webhook import GmailWebhookHandler
+
+
+class WebhookWorkerPool:
+    """
+    Bounded queue of decoded Gmail notifications drained by a fixed number of
+    workers. The webhook route only enqueues, and each worker runs the
+    synchronous Mongo/Google/model pipeline in a thread so the event loop
+    stays free.
+    """
+    def __init__(self, worker_count: int = 2, max_queue_size: int = 100):
+        self.worker_count = worker_count
+        self.max_queue_size = max_queue_size
+
+        self._queue = None
+        self._workers = []
+        self._executor = None
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix="webhook-worker")
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{idx}")
+            for idx in range(self.worker_count)
+        ]
+        print(f"[WebhookWorkerPool] Started {self.worker_count} workers (queue size {self.max_queue_size}).")
+
+    def try_enqueue(self, handler: GmailWebhookHandler) -> bool:
+        """
+        Queues a decoded notification. Returns False when the queue is full so
+        the caller can push back on Pub/Sub instead of dropping the work.
+        """
+        if self._queue is None:
+            raise RuntimeError("WebhookWorkerPool has not been started.")
+        try:
+            self._queue.put_nowait((handler, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def stop(self, drain_timeout: float = 30.0):
+        """
+        Waits for queued notifications to finish, up to `drain_timeout`, then
+        cancels the workers.
+        """
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"[WebhookWorkerPool] Drain timed out with {self._queue.qsize()} notifications still queued.")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._executor.shutdown(wait=True)
+        print("[WebhookWorkerPool] Stopped.")
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.total_wait_seconds / (self.processed + self.failed), 3) if (self.processed + self.failed) else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            handler, enqueued_at = await self._queue.get()
+            wait_seconds = time.monotonic() - enqueued_at
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            try:
+                await loop.run_in_executor(self._executor, handler.process)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[WebhookWorkerPool] Notification processing failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+webhook_worker_pool = WebhookWorkerPool(
+    worker_count=settings.WEBHOOK_WORKER_COUNT,
+    max_queue_size=settings.WEBHOOK_QUEUE_MAX_SIZE,
+)
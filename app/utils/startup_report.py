@@ -0,0 +1,46 @@
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# Lines look like: "import time:       self [us] |  cumulative | imported package"
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import_times(module: str = "main") -> list[tuple[str, int, int]]:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime` and returns
+    (module, self_us, cumulative_us) for every module it pulled in.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            timings.append((name, int(self_us), int(cumulative_us)))
+    return timings
+
+
+def print_import_report(module: str = "main", top: int = 15):
+    """
+    Prints the total import time of `module` and the slowest top-level
+    packages, so heavy imports that sneak onto the startup path stand out.
+    """
+    timings = measure_import_times(module)
+    by_package = defaultdict(int)
+    for name, self_us, _ in timings:
+        by_package[name.split(".")[0]] += self_us
+
+    total_us = sum(by_package.values())
+    print(f"Importing '{module}' took {total_us / 1000:.1f} ms across {len(timings)} modules.")
+    print(f"{'package':<32}{'ms':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{package:<32}{self_us / 1000:>10.1f}{self_us / total_us:>8.1%}")
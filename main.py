@@ -1,3 +1,6 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -6,11 +9,53 @@ from app.apis.v1.rules_routes import router as summarize_rules_router
 from app.apis.v1.filtering_routes import router as filtering_router
 from app.apis.v1.gmail_webhook import router as webhook_router
 from app.apis.v1.auth_routes import router as auth_router
+from app.apis.v1.health_routes import router as health_router
+from app.core.config import settings
+from app.db_utils.indexes import ensure_indexes
+from app.services.model_registry import model_registry
+from app.services.webhook_worker_pool import webhook_worker_pool
+from app.services.rules_cache import rules_cache
+from app.services.notification_stream import notification_stream
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The registry owns the transformer pipelines for the whole process.
+    app.state.model_registry = model_registry
+    # In the background, so a slow or unreachable database doesn't hold up startup and /health/live.
+    app.state.index_task = asyncio.create_task(asyncio.to_thread(ensure_indexes))
+    if settings.MODEL_WARMUP_ON_STARTUP:
+        # Load the models in the background so auth and rules traffic is served
+        # right away; /apis/v1/health/ready reports when they are loaded.
+        app.state.warmup_task = asyncio.create_task(_warm_up_models())
+    rules_cache.start()
+    if settings.NOTIFICATION_QUEUE_BACKEND == "local":
+        await webhook_worker_pool.start()
+    else:
+        # Notifications are processed by worker.py; this process only appends them to the stream.
+        try:
+            await asyncio.to_thread(notification_stream.ensure_group)
+        except Exception as e:
+            print(f"[Startup] Redis Stream not reachable yet, the webhook will answer 503 until it is: {e}")
+    yield
+    await webhook_worker_pool.stop(drain_timeout=settings.WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+    rules_cache.stop()
+    model_registry.shutdown()
+
+
+async def _warm_up_models():
+    try:
+        await asyncio.to_thread(model_registry.warmup)
+        print(f"[Startup] Models warmed up: {model_registry.stats()}")
+    except Exception as e:
+        print(f"[Startup] Model warmup failed, models will load on first use: {e}")
+
 
 app = FastAPI(
     title="AI Email Summarizer",
     version="1.0.0",
     description="Summarizes emails using AI",
+    lifespan=lifespan,
 )
 
 # Define allowed origins for CORS
@@ -33,7 +78,24 @@ app.include_router(summarize_rules_router, prefix='/apis/v1', tags=["Rules"])
 app.include_router(filtering_router, prefix='/apis/v1')
 app.include_router(webhook_router, prefix='/apis/v1', tags=["Webhook"])
 app.include_router(auth_router, prefix='/apis/v1')
+app.include_router(health_router, prefix='/apis/v1', tags=["Health"])
 
 @app.get('/')
 async def root():
-    return {"message": "Welcome to AI Email Summarizer"}
\ No newline at end of file
+    return {"message": "Welcome to AI Email Summarizer"}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AI Email Summarizer")
+    parser.add_argument("--import-report", action="store_true",
+                        help="Print how long importing the app takes, broken down by package, and exit.")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to show in the import report.")
+    args = parser.parse_args()
+
+    if args.import_report:
+        from app.utils.startup_report import print_import_report
+        print_import_report("main", top=args.top)
+    else:
+        parser.print_help()
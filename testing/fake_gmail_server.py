@@ -0,0 +1,68 @@
+# Minimal fake of the Gmail REST endpoints used by AsyncGmailClient.
+#
+# Run it, then point the app at it:
+#   uvicorn testing.fake_gmail_server:app --port 8765
+#   GMAIL_CLIENT_BACKEND=httpx GMAIL_API_BASE_URL=http://127.0.0.1:8765 uvicorn main:app
+#
+# Every FAIL_EVERY-th request answers 429 so the backoff path gets exercised.
+import os
+from itertools import count
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+FAIL_EVERY = int(os.environ.get("FAKE_GMAIL_FAIL_EVERY", "5"))
+MESSAGE_COUNT = int(os.environ.get("FAKE_GMAIL_MESSAGES", "120"))
+PAGE_SIZE = 25
+
+app = FastAPI(title="Fake Gmail")
+request_counter = count(1)
+
+MESSAGES = {
+    f"msg{i}": {
+        "id": f"msg{i}",
+        "threadId": f"thread{i}",
+        "snippet": f"Invoice {i} is attached, payment is due in 14 days.",
+        "payload": {"headers": [{"name": "Subject", "value": f"Invoice {i}"}, {"name": "From", "value": "billing@example.com"}]},
+    }
+    for i in range(MESSAGE_COUNT)
+}
+
+
+@app.middleware("http")
+async def throttle_some_requests(request, call_next):
+    if FAIL_EVERY and next(request_counter) % FAIL_EVERY == 0:
+        return JSONResponse(status_code=429, content={"error": {"message": "Rate limit exceeded"}}, headers={"Retry-After": "0"})
+    return await call_next(request)
+
+
+@app.get("/gmail/v1/users/me/history")
+async def list_history(startHistoryId: str, pageToken: str | None = None):
+    start = int(pageToken or 0)
+    message_ids = list(MESSAGES)[start:start + PAGE_SIZE]
+    response = {
+        "history": [{"id": str(1000 + start + i), "messagesAdded": [{"message": {"id": message_id}}]} for i, message_id in enumerate(message_ids)],
+        "historyId": str(1000 + MESSAGE_COUNT),
+    }
+    if start + PAGE_SIZE < MESSAGE_COUNT:
+        response["nextPageToken"] = str(start + PAGE_SIZE)
+    return response
+
+
+@app.get("/gmail/v1/users/me/messages")
+async def list_messages(maxResults: int = 10, q: str | None = None):
+    return {"messages": [{"id": message_id, "threadId": message["threadId"]} for message_id, message in list(MESSAGES.items())[:maxResults]]}
+
+
+@app.get("/gmail/v1/users/me/messages/{message_id}")
+async def get_message(message_id: str, metadataHeaders: list[str] = Query(default=[])):
+    message = MESSAGES.get(message_id)
+    if message is None:
+        return JSONResponse(status_code=404, content={"error": {"message": "Not Found"}})
+    headers = [header for header in message["payload"]["headers"] if not metadataHeaders or header["name"] in metadataHeaders]
+    return {**message, "payload": {"headers": headers}}
+
+
+@app.post("/gmail/v1/users/me/watch")
+async def watch():
+    return {"historyId": "1000", "expiration": "9999999999999"}
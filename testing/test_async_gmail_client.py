@@ -0,0 +1,78 @@
+# Drives AsyncGmailClient against the fake Gmail server in-process.
+#
+#   python -m pytest testing/test_async_gmail_client.py
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.google_services.async_client import AsyncGmailClient, TokenBucket
+from app.services.google_services.handler import MessageFetchError
+from testing import fake_gmail_server
+
+
+class FakeCredentials:
+    valid = True
+    token = "fake-access-token"
+
+
+def run_with_client(test, fail_every: int, monkeypatch):
+    monkeypatch.setattr(fake_gmail_server, "FAIL_EVERY", fail_every)
+
+    async def run():
+        transport = httpx.ASGITransport(app=fake_gmail_server.app)
+        async with httpx.AsyncClient(transport=transport) as http_client:
+            # A fresh user key, so each test gets its own per-user limits.
+            client = AsyncGmailClient(FakeCredentials(), f"test-{uuid.uuid4().hex}", base_url="http://fake-gmail", http_client=http_client)
+            return await test(client)
+
+    return asyncio.run(run())
+
+
+def test_throttled_fetches_are_retried(monkeypatch):
+    async def test(client):
+        return await client.get_emails_by_ids(["msg0", "msg1", "msg2", "msg3", "msg4"]), client.retries
+
+    messages_by_id, retries = run_with_client(test, fail_every=3, monkeypatch=monkeypatch)
+
+    assert set(messages_by_id) == {"msg0", "msg1", "msg2", "msg3", "msg4"}
+    assert retries > 0
+
+
+def test_missing_messages_are_skipped(monkeypatch):
+    async def test(client):
+        return await client.get_emails_by_ids(["msg0", "deleted-message"])
+
+    messages_by_id = run_with_client(test, fail_every=0, monkeypatch=monkeypatch)
+
+    assert set(messages_by_id) == {"msg0"}
+
+
+def test_fetches_failing_after_retries_raise(monkeypatch):
+    monkeypatch.setattr(settings, "GMAIL_MAX_RETRIES", 1)
+
+    async def test(client):
+        return await client.get_emails_by_ids(["msg0", "msg1"])
+
+    with pytest.raises(MessageFetchError) as error:
+        run_with_client(test, fail_every=1, monkeypatch=monkeypatch)
+
+    assert set(error.value.failed_ids) == {"msg0", "msg1"}
+    assert error.value.fetched == {}
+
+
+def test_quota_bucket_paces_requests(monkeypatch):
+    async def test(client):
+        # Room for one 5-unit messages.get call at a time, refilled at 50 units per second.
+        client.limits.quota = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        await client.get_emails_by_ids(["msg0", "msg1", "msg2"])
+        return time.monotonic() - started
+
+    elapsed = run_with_client(test, fail_every=0, monkeypatch=monkeypatch)
+
+    # The second and third calls each wait ~0.1s for the bucket to refill.
+    assert elapsed >= 0.18
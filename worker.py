@@ -0,0 +1,103 @@
+"""
+Consumes Gmail notifications from the Redis Stream the webhook writes to
+when NOTIFICATION_QUEUE_BACKEND=redis_stream.
+
+Run any number of these, on any number of nodes:
+    python worker.py --threads 2
+
+With NOTIFICATION_SHARDING_ENABLED each worker also reads its own stream,
+which the webhook fills by consistent hashing on the user. Its entries are
+handed to the remaining workers when it stops.
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+
+from app.core.config import settings
+from app.db_utils.indexes import ensure_indexes
+from app.services.gmail_webhook import GmailWebhookHandler
+from app.services.google_services.auth_handler import GoogleAuthHandler
+from app.services.google_services.client_pool import gmail_client_pool
+from app.services.model_registry import model_registry
+from app.services.notification_stream import notification_stream
+from app.services.rules_cache import rules_cache
+
+
+def handle_notification(data: str):
+    handler = GmailWebhookHandler(payload={"message": {"data": data}})
+    handler.process()
+
+
+def shard_report() -> dict:
+    """
+    Hit rates of this worker's per-user caches, published with each
+    heartbeat for the webhook stats endpoint. Sharding pays off when these
+    stay high.
+    """
+    client_pool = gmail_client_pool.stats()
+    client_lookups = client_pool["hits"] + client_pool["misses"]
+    report = {
+        "credentials_hit_rate": GoogleAuthHandler.stats()["hit_rate"],
+        "gmail_client_pool_hit_rate": round(client_pool["hits"] / client_lookups, 4) if client_lookups else None,
+        "rules_cache_hit_rate": rules_cache.stats()["hit_rate"],
+    }
+    classification_cache = model_registry.get_classification_cache()
+    if classification_cache is not None:
+        report["classification_cache_hit_rate"] = classification_cache.stats()["hit_rate"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gmail notification worker")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Consumer name; must be unique per worker process.")
+    parser.add_argument("--threads", type=int, default=settings.NOTIFICATION_WORKER_THREADS,
+                        help="Notifications processed concurrently by this process.")
+    args = parser.parse_args()
+    if settings.NOTIFICATION_SHARDING_ENABLED and args.name in notification_stream.members():
+        # A second worker under the same name would share, and on leaving delete, the first one's shard stream.
+        parser.error(f"a live worker named {args.name!r} is already heartbeating; pick another --name")
+
+    ensure_indexes()
+    if settings.MODEL_WARMUP_ON_STARTUP:
+        model_registry.warmup()
+    rules_cache.start()
+    notification_stream.ensure_group()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    consumers = [
+        threading.Thread(
+            target=notification_stream.consume,
+            args=(f"{args.name}-{idx}", handle_notification, stop),
+            kwargs={"worker": args.name},
+            name=f"notification-consumer-{idx}",
+        )
+        for idx in range(args.threads)
+    ]
+    if settings.NOTIFICATION_SHARDING_ENABLED:
+        consumers.append(threading.Thread(
+            target=notification_stream.heartbeat,
+            args=(args.name, stop, shard_report),
+            name="notification-heartbeat",
+        ))
+    for consumer in consumers:
+        consumer.start()
+    print(f"[Worker] {args.name} consuming {settings.NOTIFICATION_STREAM} with {args.threads} thread(s).")
+
+    # Each consumer finishes its current notification and exits within one read timeout.
+    for consumer in consumers:
+        consumer.join()
+    if settings.NOTIFICATION_SHARDING_ENABLED:
+        notification_stream.leave(args.name)
+    rules_cache.stop()
+    model_registry.shutdown()
+    print(f"[Worker] {args.name} stopped.")
+
+
+if __name__ == "__main__":
+    main()